@@ -7,17 +7,23 @@ import streamlit as st
 import pandas as pd
 import pdfplumber
 import io
-from fuzzywuzzy import fuzz
 from typing import Dict, List, Tuple, Optional
 import re
 import sys
 from pathlib import Path
 import pickle
 import hashlib
+import time
 
 # Add intelligent mapper to path
 sys.path.insert(0, str(Path(__file__).parent))
 from intelligent_mapper import IntelligentMapper, StructuredMapper
+from utils.excel_parsing import extract_accounts
+from utils.excel_streaming import iter_sheets
+from utils.sheet_profile import HeaderRule, default_profile_cache
+from utils.mapping_memory import default_mapping_memory
+from utils.fuzzy_index import FuzzyIndex
+from config.settings import EXCEL_STREAMING_THRESHOLD_MB, PROGRESS_UPDATE_INTERVAL
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
@@ -84,119 +90,105 @@ st.markdown(
 class ExcelExtractor:
     """Extract data properly from multi-sheet Excel files"""
 
+    # Header: first row below the sheet's first row mentioning particulars
+    # or account; most recent year column holds the values
+    HEADER_RULE = HeaderRule(
+        name="statement",
+        header_keywords=("particular", "account"),
+        description_keywords=("particular", "account", "description"),
+        first_row=1,
+        year_pattern=re.compile(r"^(20\d{2})\.?\d*$"),
+    )
+
     @staticmethod
     def extract_all_accounts(excel_bytes: bytes) -> Dict[str, float]:
         """Extract ALL accounts with values from Excel file"""
-        all_accounts = {}
-
         try:
-            excel_file = io.BytesIO(excel_bytes)
+            # Large workbooks are streamed sheet-by-sheet instead of loaded whole
+            if len(excel_bytes) >= EXCEL_STREAMING_THRESHOLD_MB * 1024 * 1024:
+                return ExcelExtractor._extract_streaming(excel_bytes)
 
-            # Read all sheets
-            sheet_dict = pd.read_excel(excel_file, sheet_name=None)
+            return ExcelExtractor._extract_pandas(excel_bytes)
 
-            for sheet_name, df in sheet_dict.items():
-                # Skip small sheets
-                if len(df) < 3:
-                    continue
+        except Exception as e:
+            st.error(f"Excel extraction error: {e}")
+            return {}
 
-                # Find header row (contains 'Particulars' or similar)
-                header_row = None
-                for idx in range(min(10, len(df))):
-                    row_text = " ".join(
-                        [str(val).lower() for val in df.iloc[idx] if pd.notna(val)]
-                    )
-                    if "particular" in row_text or "account" in row_text:
-                        header_row = idx
-                        break
-
-                if header_row is None:
-                    continue
-
-                # Re-read with proper header
-                df_clean = df.iloc[header_row:].copy()
-                df_clean.columns = df_clean.iloc[0]
-                df_clean = df_clean[1:].reset_index(drop=True)
-
-                # Find description column
-                desc_col = None
-                for col in df_clean.columns:
-                    col_str = str(col).lower()
-                    if (
-                        "particular" in col_str
-                        or "account" in col_str
-                        or "description" in col_str
-                    ):
-                        desc_col = col
-                        break
-
-                if desc_col is None:
-                    desc_col = df_clean.columns[0]
-
-                # Find year columns (2025, 2024, etc.)
-                year_cols = []
-                for col in df_clean.columns:
-                    col_str = str(col)
-                    # Check if it's a year
-                    if re.match(r"^(20\d{2})\.?\d*$", col_str):
-                        year_cols.append(col)
-
-                if not year_cols:
-                    continue
-
-                # Use most recent year (first in list after sorting)
-                year_cols_sorted = sorted(year_cols, reverse=True)
-                value_col = year_cols_sorted[0]
-
-                # Extract accounts
-                for idx, row in df_clean.iterrows():
-                    account = row.get(desc_col)
-                    value = row.get(value_col)
-
-                    # Skip invalid rows
-                    if pd.isna(account) or not str(account).strip():
-                        continue
+    @staticmethod
+    def _parse_accounts(names: pd.Series, values: pd.Series) -> Dict[str, float]:
+        """Whole-column parse of a description and a value column"""
+        return extract_accounts(
+            names,
+            values,
+            ["particulars", "account", "description", "notes"],
+            parse_text_amounts=True,
+            clean_names=True,
+        )
 
-                    account_str = str(account).strip()
+    @staticmethod
+    def _extract_pandas(excel_bytes: bytes) -> Dict[str, float]:
+        """Read all sheets with pandas and extract accounts"""
+        all_accounts = {}
+        profile_cache = default_profile_cache()
+        cache_key = profile_cache.key_for(excel_bytes)
 
-                    # Skip header rows
-                    if account_str.lower() in [
-                        "particulars",
-                        "account",
-                        "description",
-                        "notes",
-                    ]:
-                        continue
+        # Read all sheets
+        sheet_dict = pd.read_excel(
+            io.BytesIO(excel_bytes), sheet_name=None, header=None
+        )
 
-                    # Try to convert value
-                    try:
-                        if pd.notna(value):
-                            # Clean value
-                            value_str = (
-                                str(value).replace(",", "").replace(" ", "").strip()
-                            )
+        for sheet_name, df in sheet_dict.items():
+            # Skip small sheets (first row plus fewer than 3 rows)
+            if len(df) < 4:
+                continue
+
+            # Header row, description and year columns (cached per workbook)
+            rule = ExcelExtractor.HEADER_RULE
+            profile = profile_cache.get_or_detect(
+                cache_key,
+                rule,
+                sheet_name,
+                lambda: df.head(rule.head_rows).values.tolist(),
+            )
+            if profile is None or profile.value_column is None:
+                continue
+
+            # Use most recent year
+            data = df.iloc[profile.header_row + 1 :]
+            all_accounts.update(
+                ExcelExtractor._parse_accounts(
+                    data.iloc[:, profile.description_column],
+                    data.iloc[:, profile.value_column],
+                )
+            )
 
-                            # Handle negatives in parentheses
-                            if value_str.startswith("(") and value_str.endswith(")"):
-                                value_str = "-" + value_str[1:-1]
+        return all_accounts
 
-                            value_float = float(value_str)
+    @staticmethod
+    def _extract_streaming(excel_bytes: bytes) -> Dict[str, float]:
+        """Same rules as _extract_pandas, reading rows lazily per sheet"""
+        all_accounts = {}
+        profile_cache = default_profile_cache()
+        cache_key = profile_cache.key_for(excel_bytes)
 
-                            # Store non-zero values
-                            if value_float != 0:
-                                # Clean account name
-                                account_clean = re.sub(r"^\d+\s*-\s*", "", account_str)
-                                account_clean = account_clean.replace("IC_", "")
-                                all_accounts[account_clean.strip()] = value_float
+        for sheet in iter_sheets(excel_bytes):
+            # Skip small sheets
+            if len(sheet.peek(3)) < 3:
+                continue
 
-                    except (ValueError, TypeError):
-                        continue
+            rule = ExcelExtractor.HEADER_RULE
+            profile = profile_cache.get_or_detect(
+                cache_key, rule, sheet.name, lambda: sheet.head(rule.head_rows)
+            )
+            if profile is None or profile.value_column is None:
+                continue
 
-            return all_accounts
+            positions = [profile.description_column, profile.value_column]
+            # Data rows are counted below the first row, so this skips the header
+            for names, values in sheet.column_chunks(positions, start=profile.header_row):
+                all_accounts.update(ExcelExtractor._parse_accounts(names, values))
 
-        except Exception as e:
-            st.error(f"Excel extraction error: {e}")
-            return {}
+        return all_accounts
 
 
 class PDFExtractor:
@@ -291,9 +283,31 @@ class SmartMatcher:
                 mapper = IntelligentMapper()
                 # Get double-check setting from session state
                 double_check = st.session_state.get("double_check", True)
-                return mapper.create_mappings(
-                    labels, accounts, batch_size=20, double_check=double_check
+
+                # Show first-pass rows as they arrive instead of after every batch
+                live_table = st.empty()
+                live_rows: Dict[str, Dict] = {}
+                last_render = [0.0]
+
+                def show_result(row: Dict):
+                    live_rows[row["Template Label"]] = row
+                    now = time.monotonic()
+                    if now - last_render[0] >= PROGRESS_UPDATE_INTERVAL:
+                        last_render[0] = now
+                        live_table.dataframe(
+                            pd.DataFrame(list(live_rows.values())),
+                            use_container_width=True,
+                            hide_index=True,
+                        )
+
+                mapping_df = mapper.create_mappings(
+                    labels,
+                    accounts,
+                    double_check=double_check,
+                    on_result=show_result,
                 )
+                live_table.empty()
+                return mapping_df
             except Exception as e:
                 st.error(f"❌ AI mapping failed: {e}")
                 st.warning("Falling back to structured method...")
@@ -308,19 +322,10 @@ class SmartMatcher:
         st.info("🔤 Using basic fuzzy matching...")
         mappings = []
 
-        for label in labels:
-            # Find best match
-            best_match = None
-            best_score = 0
-
-            for account_name in accounts.keys():
-                # Use token set ratio (ignores word order)
-                score = fuzz.token_set_ratio(label.lower(), account_name.lower())
-
-                if score > best_score:
-                    best_score = score
-                    best_match = account_name
+        # Best match per label by token set ratio (ignores word order)
+        matches = FuzzyIndex(accounts.keys()).best(labels)
 
+        for label, (best_match, best_score) in zip(labels, matches):
             # Determine confidence level
             if best_score >= 90:
                 confidence = "High"
@@ -348,6 +353,39 @@ class SmartMatcher:
 
         return pd.DataFrame(mappings)
 
+    @staticmethod
+    def remember_review(original: pd.DataFrame, edited: pd.DataFrame):
+        """Teach the mapping memory from a reviewed mapping table."""
+        memory = default_mapping_memory()
+        if memory is None or original is None:
+            return
+
+        # Each row's label, proposed account, confidence (Score / 100) and
+        # level, by row index: data_editor keeps the index of the rows it
+        # was given (possibly a filtered view), so repeated labels stay apart
+        scores = pd.to_numeric(original["Score"], errors="coerce").fillna(0) / 100
+        proposed = {
+            index: (label, account, score, level == "High")
+            for index, label, account, score, level in zip(
+                original.index,
+                original["Template Label"],
+                original["Matched Account"],
+                scores,
+                original["Confidence"],
+            )
+        }
+
+        rows = []
+        for index, label, account in zip(
+            edited.index, edited["Template Label"], edited["Matched Account"]
+        ):
+            row = proposed.get(index)
+            if row is None or row[0] != label:
+                # Added in the editor: nothing was proposed for it
+                row = (label, "", 0.0, False)
+            rows.append((label, account, *row[1:]))
+        memory.record_review(rows)
+
 
 class PDFGenerator:
     """Generate professional PDF from scratch (not overlay)"""
@@ -885,6 +923,10 @@ def main():
 
         # Save edited mappings
         if st.button("💾 Save Changes", key="save_mappings"):
+            try:
+                SmartMatcher.remember_review(st.session_state.mapping_df, edited_df)
+            except Exception as e:
+                st.warning(f"Could not update mapping memory: {e}")
             st.session_state.mapping_df = edited_df
             st.success("✅ Mappings saved!")
             st.session_state.step = 3
@@ -5,7 +5,7 @@ load_dotenv()
 
 # API Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
 # Vision Model for template analysis (accurate OCR)
 VISION_MODEL = "openai/gpt-4-vision-preview"
@@ -16,6 +16,8 @@ TEXT_MODEL = "meta-llama/llama-2-70b-chat"
 # File Configuration
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "100"))
 MAX_PDF_PAGES = 15
+# Workbooks at least this large are read sheet-by-sheet in streaming mode
+EXCEL_STREAMING_THRESHOLD_MB = int(os.getenv("EXCEL_STREAMING_THRESHOLD_MB", "10"))
 ALLOWED_FILE_EXTENSIONS = {".pdf", ".xlsx", ".xls"}
 
 # Processing Configuration
@@ -23,7 +25,54 @@ ALLOWED_FILE_EXTENSIONS = {".pdf", ".xlsx", ".xls"}
 _timeout_env = os.getenv("API_TIMEOUT_SECONDS")
 API_TIMEOUT_SECONDS = int(_timeout_env) if _timeout_env else None
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Shared OpenRouter client: pooled connections, retries and circuit breaking
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "1"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", "30"))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "3"))
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = float(
+    os.getenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", "60")
+)
 CACHE_ENABLED = True
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "cache/templates")
+SHEET_PROFILE_CACHE_DIR = os.getenv("SHEET_PROFILE_CACHE_DIR", "cache/sheet_profiles")
+# Parsed Finance Knowledge workbooks, rebuilt when the workbooks change
+KNOWLEDGE_SNAPSHOT_PATH = os.getenv(
+    "KNOWLEDGE_SNAPSHOT_PATH", "cache/knowledge/knowledge_snapshot.bin"
+)
+# LLM response cache: repeat prompts are answered from disk instead of the API
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_responses.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+# Label -> account memory learned from accepted mappings (kept outside cache/)
+MAPPING_MEMORY_ENABLED = os.getenv("MAPPING_MEMORY_ENABLED", "true").lower() == "true"
+MAPPING_MEMORY_PATH = os.getenv("MAPPING_MEMORY_PATH", "data/mapping_memory.sqlite3")
+MAPPING_MEMORY_MIN_CONFIDENCE = float(os.getenv("MAPPING_MEMORY_MIN_CONFIDENCE", "0.9"))
+# AI mapping: pass-1 batches in flight at once, labels per pass-2 prompt,
+# accounts shortlisted per label, and whether replies are streamed
+MAPPER_MAX_CONCURRENCY = int(os.getenv("MAPPER_MAX_CONCURRENCY", "4"))
+MAPPER_REVALIDATION_BATCH_SIZE = int(os.getenv("MAPPER_REVALIDATION_BATCH_SIZE", "5"))
+MAPPER_SHORTLIST_SIZE = int(os.getenv("MAPPER_SHORTLIST_SIZE", "25"))
+MAPPER_STREAMING = os.getenv("MAPPER_STREAMING", "true").lower() == "true"
+# AI mapping batches: sized per model by prompt budget and measured reply speed
+MAPPER_MAX_BATCH_SIZE = int(os.getenv("MAPPER_MAX_BATCH_SIZE", "30"))
+MAPPER_PROMPT_TOKEN_BUDGET = int(os.getenv("MAPPER_PROMPT_TOKEN_BUDGET", "12000"))
+MAPPER_BATCH_TARGET_SECONDS = float(os.getenv("MAPPER_BATCH_TARGET_SECONDS", "90"))
+# Labels whose best shortlist score reaches this go to the fast model
+MAPPER_EASY_SCORE = float(os.getenv("MAPPER_EASY_SCORE", "0.8"))
+# A failed model is tried first again after this long
+MAPPER_MODEL_RECOVERY_SECONDS = float(os.getenv("MAPPER_MODEL_RECOVERY_SECONDS", "120"))
+# Structured (non-AI) mapping scores label sets this large in a process pool
+STRUCTURED_MAPPER_WORKERS = int(
+    os.getenv("STRUCTURED_MAPPER_WORKERS", str(os.cpu_count() or 1))
+)
+STRUCTURED_MAPPER_PARALLEL_THRESHOLD = int(
+    os.getenv("STRUCTURED_MAPPER_PARALLEL_THRESHOLD", "500")
+)
+# TEMPLATE_ANALYSIS_WORKERS: processes used to analyze template pages (1 = serial)
+TEMPLATE_ANALYSIS_WORKERS = int(os.getenv("TEMPLATE_ANALYSIS_WORKERS", "1"))
 
 # UI Configuration
 PROGRESS_UPDATE_INTERVAL = 0.5
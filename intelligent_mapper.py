@@ -5,12 +5,40 @@ Uses AI with financial context to create accurate mappings between template and
 
 import os
 import json
+import queue
+import threading
+import time
 import requests
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import Callable, Dict, List, Tuple, Optional
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
 import re
 
+from config.settings import (
+    MAPPER_MAX_CONCURRENCY,
+    MAPPER_REVALIDATION_BATCH_SIZE,
+    MAPPER_SHORTLIST_SIZE,
+    MAPPER_STREAMING,
+    OPENROUTER_BASE_URL,
+    STRUCTURED_MAPPER_PARALLEL_THRESHOLD,
+    STRUCTURED_MAPPER_WORKERS,
+)
+from utils.account_index import AccountIndex
+from utils.fuzzy_index import FuzzyIndex
+from utils.http_client import default_http_client
+from utils.json_stream import JSONObjectStream
+from utils.llm_cache import default_llm_cache
+from utils.mapping_memory import RememberedMapping, default_mapping_memory
+from utils.mapping_scheduler import MappingBatch, default_mapping_scheduler
+
 load_dotenv()
 
 
@@ -19,50 +47,146 @@ class IntelligentMapper:
 
     def __init__(self):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = OPENROUTER_BASE_URL
         # Free models with fallback
         self.models = [
             "gpt-oss-20b:free",  # Primary free model
             "gpt-oss-120b",  # Fallback paid model if free fails
             "alibaba/tongyi-deepresearch-30b-a3b:free",  # Additional fallback
         ]
-        self.current_model_index = 0
-        self.model = self.models[0]
+        # Batches in flight at once during pass 1
+        self.max_concurrency = MAPPER_MAX_CONCURRENCY
+        # Uncertain labels reviewed per pass-2 prompt
+        self.revalidation_batch_size = MAPPER_REVALIDATION_BATCH_SIZE
+        # Accounts shortlisted per label for the pass-1 prompt
+        self.shortlist_size = MAPPER_SHORTLIST_SIZE
+        # Stream pass-1 replies so rows can be reported as they arrive
+        self.streaming = MAPPER_STREAMING
+        # Fuzzy index over the last account set seen, for fallbacks and pass 2
+        self._fuzzy_index: Optional[FuzzyIndex] = None
+        self._fuzzy_index_lock = threading.Lock()
+        # Pooled connections, retries and per-model circuit breaking
+        self.http = default_http_client()
+        # Batch sizing, easy/hard model routing and model recovery
+        self.scheduler = default_mapping_scheduler(self.models)
+        # Repeat prompts are answered from disk instead of the API
+        self.response_cache = default_llm_cache()
+        # Accepted label -> account pairs from earlier runs
+        self.mapping_memory = default_mapping_memory()
 
     def create_mappings(
         self,
         template_labels: List[str],
         excel_accounts: Dict[str, float],
-        batch_size: int = 20,  # Smaller batches for higher accuracy
+        batch_size: Optional[int] = None,  # None: sized per model by the scheduler
         double_check: bool = True,  # Enable second-pass validation
+        max_concurrency: Optional[int] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
     ) -> pd.DataFrame:
         """
         Create intelligent mappings using AI with financial context.
         Optimized for 100% accuracy over speed.
-        Uses smaller batches and multi-pass validation.
+        Uses multi-pass validation; labels with a clear lexical match go to
+        the fast primary model, harder ones to the larger model.
 
         Args:
             template_labels: List of labels from template
             excel_accounts: Dict of account names to values
-            batch_size: Number of items per batch (smaller = more accurate)
+            batch_size: Fixed number of items per batch; by default each
+                model's batches are sized to the prompt token budget and
+                its measured reply speed
             double_check: If True, re-validates uncertain mappings (recommended)
+            max_concurrency: Batches sent to the API at once
+                (default: MAPPER_MAX_CONCURRENCY, 4)
+            on_result: Called on this thread with each pass-1 row as soon as
+                it is known (streamed rows first, then again when the batch
+                completes); later rows for a label replace earlier ones
         """
 
-        all_mappings = []
+        # Labels with a trusted remembered account skip the LLM entirely
+        remembered = (
+            self.mapping_memory.lookup(template_labels, excel_accounts.keys())
+            if self.mapping_memory
+            else {}
+        )
+        new_labels = [label for label in template_labels if label not in remembered]
+        if remembered:
+            print(
+                f"🧠 {len(template_labels) - len(new_labels)} labels answered from mapping memory"
+            )
 
         # PASS 1: Initial AI mapping
         print("\n=== PASS 1: Initial AI Mapping ===")
-        total_batches = (len(template_labels) - 1) // batch_size + 1
-        for i in range(0, len(template_labels), batch_size):
-            batch_labels = template_labels[i : i + batch_size]
-            print(
-                f"🤖 AI Processing batch {i // batch_size + 1}/{total_batches} ({len(batch_labels)} items)..."
-            )
 
-            batch_mappings = self._map_batch(batch_labels, excel_accounts)
-            all_mappings.extend(batch_mappings)
+        # Built once; each batch prompt only lists its shortlisted accounts
+        account_index = AccountIndex(excel_accounts)
+
+        batches: List[MappingBatch] = self.scheduler.plan(
+            new_labels, account_index, self.shortlist_size, batch_size
+        )
+        total_batches = len(batches)
+        workers = max(1, min(max_concurrency or self.max_concurrency, total_batches))
+        hard_labels = sum(len(batch.labels) for batch in batches if batch.hard)
+        print(
+            f"🤖 AI Processing {total_batches} batches ({len(new_labels) - hard_labels} easy, "
+            f"{hard_labels} hard labels), up to {workers} at a time..."
+        )
+
+        remembered_rows = {
+            label: self._remembered_mapping(label, mapping, excel_accounts)
+            for label, mapping in remembered.items()
+        }
 
-            print(f"   ✓ Batch {i // batch_size + 1} complete")
+        # Rows found on worker threads are queued and handed to on_result
+        # here, on the caller's thread
+        updates: "queue.Queue[Dict]" = queue.Queue()
+        stream_to = updates.put if on_result and self.streaming else None
+        if on_result:
+            for row in remembered_rows.values():
+                on_result(row)
+
+        # Each batch falls back through the models on its own; results are
+        # put back in label order whatever order the batches finish in
+        ai_rows: Dict[str, Dict] = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    self._map_batch,
+                    batch.labels,
+                    excel_accounts,
+                    account_index,
+                    stream_to,
+                    batch.model_index,
+                ): index
+                for index, batch in enumerate(batches)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=0.2 if on_result else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    index = futures[future]
+                    rows = future.result()
+                    ai_rows.update((row["Template Label"], row) for row in rows)
+                    print(
+                        f"   ✓ Batch {index + 1}/{total_batches} complete ({len(rows)} items)"
+                    )
+                    if on_result:
+                        for row in rows:
+                            updates.put(row)
+
+                while on_result and not updates.empty():
+                    on_result(updates.get())
+
+        self._log_throughput()
+
+        all_mappings = [
+            remembered_rows[label] if label in remembered else ai_rows[label]
+            for label in template_labels
+        ]
 
         # Convert to DataFrame
         df = pd.DataFrame(all_mappings)
@@ -76,65 +200,165 @@ class IntelligentMapper:
 
         return df
 
+    def _log_throughput(self):
+        """Print each model's batches, failures and speed this session"""
+
+        for model, stats in self.scheduler.throughput().items():
+            print(
+                f"   📈 {model}: {stats['batches']} batches, {stats['labels']} labels, "
+                f"{stats['failures']} failures, {stats['labels_per_second']:.2f} labels/s, "
+                f"{stats['tokens_per_second']:.0f} tokens/s"
+            )
+
+    def _remembered_mapping(
+        self,
+        label: str,
+        remembered: RememberedMapping,
+        excel_accounts: Dict[str, float],
+    ) -> Dict:
+        """Result row for a label answered from the mapping memory"""
+
+        confidence = remembered.confidence
+        if confidence >= 0.9:
+            status, conf_label = "✅", "High"
+        elif confidence >= 0.7:
+            status, conf_label = "⚠️", "Medium"
+        else:
+            status, conf_label = "❌", "Low"
+
+        return {
+            "Status": status,
+            "Template Label": label,
+            "Matched Account": remembered.account,
+            "Value (2025)": excel_accounts.get(remembered.account, 0),
+            "Confidence": conf_label,
+            "Score": int(confidence * 100),
+            "AI Reasoning": (
+                f"Remembered mapping (accepted {remembered.accepted}x, "
+                f"used {remembered.uses}x)"
+            ),
+        }
+
     def _map_batch(
-        self, template_labels: List[str], excel_accounts: Dict[str, float]
+        self,
+        template_labels: List[str],
+        excel_accounts: Dict[str, float],
+        account_index: Optional[AccountIndex] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        model_index: int = 0,
     ) -> List[Dict]:
-        """Map a batch of template labels to excel accounts using AI"""
+        """Map a batch of template labels to excel accounts using AI.
 
-        # Prepare account list with values for context - include MORE context for accuracy
-        account_list = []
-        for account, value in excel_accounts.items():
-            account_list.append(f"{account} (${value:,.2f})")
+        model_index is the model the batch is routed to; it is skipped
+        while demoted. With on_result, the reply is streamed and each
+        label's row is reported as soon as its entry is complete.
+        """
+
+        # Only accounts plausible for some label in this batch go in the prompt
+        if account_index is None:
+            account_index = AccountIndex(excel_accounts)
+        shortlist = account_index.shortlist(template_labels, self.shortlist_size)
+
+        # Prepare account list with values for context
+        account_list = [
+            f"{account} (${excel_accounts[account]:,.2f})" for account in shortlist
+        ]
 
         prompt = self._build_intelligent_prompt(
             template_labels,
-            account_list[:500],  # More context for better accuracy
+            account_list[:500],  # Cap for very broad batches
         )
 
         try:
-            mappings_json = self._call_ai(prompt)
-            mappings = self._parse_ai_response(mappings_json, excel_accounts)
-
-            # Create result list
-            results = []
-            for label in template_labels:
-                mapping = mappings.get(label, {})
-                matched_account = mapping.get("account", "")
-                confidence = mapping.get("confidence", 0)
-                reasoning = mapping.get("reasoning", "")
-
-                # Get value
-                value = excel_accounts.get(matched_account, 0) if matched_account else 0
-
-                # Determine status
-                if confidence >= 0.9:
-                    status = "✅"
-                    conf_label = "High"
-                elif confidence >= 0.7:
-                    status = "⚠️"
-                    conf_label = "Medium"
-                else:
-                    status = "❌"
-                    conf_label = "Low"
-
-                results.append(
-                    {
-                        "Status": status,
-                        "Template Label": label,
-                        "Matched Account": matched_account,
-                        "Value (2025)": value,
-                        "Confidence": conf_label,
-                        "Score": int(confidence * 100),
-                        "AI Reasoning": reasoning,
-                    }
+            model_index = self.scheduler.start_model(model_index)
+            if on_result is None:
+                mappings_json = self._call_ai(
+                    prompt, model_index=model_index, label_count=len(template_labels)
+                )
+                mappings = self._parse_ai_response(mappings_json, excel_accounts)
+            else:
+                mappings = self._stream_batch(
+                    prompt, template_labels, excel_accounts, on_result, model_index
                 )
 
-            return results
+            # Create result list
+            return [
+                self._mapping_row(label, mappings.get(label, {}), excel_accounts)
+                for label in template_labels
+            ]
 
         except Exception as e:
             print(f"AI mapping failed: {e}, falling back to fuzzy matching")
             return self._fallback_fuzzy_match(template_labels, excel_accounts)
 
+    def _stream_batch(
+        self,
+        prompt: str,
+        template_labels: List[str],
+        excel_accounts: Dict[str, float],
+        on_result: Callable[[Dict], None],
+        model_index: Optional[int] = None,
+    ) -> Dict:
+        """Call the AI in streaming mode, reporting each label's row on arrival"""
+
+        wanted = set(template_labels)
+        streamed = {}
+
+        def on_entry(label, mapping_data):
+            mapping = self._clean_mapping(mapping_data, excel_accounts)
+            if label not in wanted or mapping is None:
+                return
+            try:
+                row = self._mapping_row(label, mapping, excel_accounts)
+            except (TypeError, ValueError):
+                return  # e.g. a non-numeric confidence; the final parse decides
+            streamed[label] = mapping
+            on_result(row)
+
+        mappings_json = self._call_ai(
+            prompt,
+            model_index=model_index,
+            on_entry=on_entry,
+            label_count=len(template_labels),
+        )
+
+        # A complete reply is parsed as a whole, as without streaming; the
+        # streamed entries stand in if it does not parse (e.g. cut off)
+        return self._parse_ai_response(mappings_json, excel_accounts) or streamed
+
+    def _mapping_row(
+        self, label: str, mapping: Dict, excel_accounts: Dict[str, float]
+    ) -> Dict:
+        """Result row for a label from its cleaned AI mapping"""
+
+        matched_account = mapping.get("account", "")
+        confidence = mapping.get("confidence", 0)
+        reasoning = mapping.get("reasoning", "")
+
+        # Get value
+        value = excel_accounts.get(matched_account, 0) if matched_account else 0
+
+        # Determine status
+        if confidence >= 0.9:
+            status = "✅"
+            conf_label = "High"
+        elif confidence >= 0.7:
+            status = "⚠️"
+            conf_label = "Medium"
+        else:
+            status = "❌"
+            conf_label = "Low"
+
+        return {
+            "Status": status,
+            "Template Label": label,
+            "Matched Account": matched_account,
+            "Value (2025)": value,
+            "Confidence": conf_label,
+            "Score": int(confidence * 100),
+            "AI Reasoning": reasoning,
+        }
+
     def _build_intelligent_prompt(
         self, template_labels: List[str], account_list: List[str]
     ) -> str:
@@ -222,63 +446,98 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
 
         return prompt
 
-    def _call_ai(self, prompt: str, retry_count: int = 0) -> str:
-        """Call OpenRouter API with the mapping prompt, with model fallback"""
+    def _call_ai(
+        self,
+        prompt: str,
+        retry_count: int = 0,
+        model_index: Optional[int] = None,
+        on_entry: Optional[Callable[[str, object], None]] = None,
+        label_count: int = 0,
+    ) -> str:
+        """Call OpenRouter API with the mapping prompt, with model fallback.
+
+        Each call walks the fallback chain on its own, starting from
+        model_index (default: the primary model unless it is demoted), so
+        concurrent batches do not switch models under each other. Answers
+        and failures are reported to the scheduler, which sizes later
+        batches from the reply speed and demotes failing models for a while.
+        With on_entry, the reply is streamed and on_entry gets each
+        top-level (label, mapping) entry as soon as it is complete.
+        """
+
+        if model_index is None:
+            model_index = self.scheduler.start_model(0)
+        model = self.models[model_index]
 
         headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
             "HTTP-Referer": "http://localhost:8503",
             "X-Title": "Financial Statement Mapper",
         }
 
-        payload = {
-            "model": self.model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a senior financial accountant with expertise in financial statement preparation, GAAP/IFRS standards, and chart of accounts mapping. Your responses must be accurate, thoughtful, and in valid JSON format only. Accuracy is more important than speed.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            "temperature": 0.05,  # Very low temperature for maximum consistency and accuracy
-            "max_tokens": 16000,  # More tokens for detailed responses
-            "top_p": 0.9,  # Focused sampling
-        }
+        messages = [
+            {
+                "role": "system",
+                "content": "You are a senior financial accountant with expertise in financial statement preparation, GAAP/IFRS standards, and chart of accounts mapping. Your responses must be accurate, thoughtful, and in valid JSON format only. Accuracy is more important than speed.",
+            },
+            {"role": "user", "content": prompt},
+        ]
+        temperature = 0.05  # Very low temperature for maximum consistency and accuracy
+
+        if self.response_cache:
+            cached = self.response_cache.get(model, temperature, messages)
+            if cached is not None:
+                if on_entry:
+                    for label, mapping_data in JSONObjectStream().feed(cached):
+                        on_entry(label, mapping_data)
+                return cached
+
+        request = dict(
+            timeout=300,  # 5 minutes - accuracy over speed
+            headers=headers,
+            max_tokens=16000,  # More tokens for detailed responses
+            top_p=0.9,  # Focused sampling
+        )
 
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=300,  # 5 minutes - accuracy over speed
-            )
-
-            if response.status_code == 429 or response.status_code == 503:
-                # Rate limit or service unavailable - try next model
-                raise Exception(f"Model unavailable: {response.status_code}")
-
-            if response.status_code != 200:
-                raise Exception(f"API error {response.status_code}: {response.text}")
-
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-
-            return content
+            # 429/503 are retried with backoff first; a model whose circuit
+            # is open fails immediately and the next one is tried
+            if on_entry is None:
+                content = self.http.chat_completion(
+                    model, messages, temperature, **request
+                )
+            else:
+                parser = JSONObjectStream()
+                parts = []
+                for delta in self.http.stream_chat_completion(
+                    model, messages, temperature, **request
+                ):
+                    parts.append(delta)
+                    for label, mapping_data in parser.feed(delta):
+                        on_entry(label, mapping_data)
+                content = "".join(parts)
 
         except Exception as e:
-            # Try fallback model if available
-            if self.current_model_index < len(self.models) - 1 and retry_count < len(
-                self.models
-            ):
-                self.current_model_index += 1
-                old_model = self.model
-                self.model = self.models[self.current_model_index]
-                print(f"   ⚠️ Model {old_model} failed, switching to {self.model}")
-                return self._call_ai(prompt, retry_count + 1)
+            self.scheduler.record_failure(model_index)
+            # Try the next model in the chain, wrapping round to the primary
+            if retry_count < len(self.models) - 1:
+                next_index = (model_index + 1) % len(self.models)
+                print(
+                    f"   ⚠️ Model {model} failed, switching to {self.models[next_index]}"
+                )
+                return self._call_ai(
+                    prompt, retry_count + 1, next_index, on_entry, label_count
+                )
             else:
                 raise Exception(f"All models failed: {str(e)}")
 
+        self.scheduler.record_success(
+            model_index, label_count, time.perf_counter() - started, content
+        )
+        if self.response_cache:
+            self.response_cache.put(model, temperature, messages, content)
+        return content
+
     def _parse_ai_response(
         self, ai_response: str, excel_accounts: Dict[str, float]
     ) -> Dict:
@@ -298,19 +557,9 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
             # Validate and clean mappings
             clean_mappings = {}
             for label, mapping_data in mappings_raw.items():
-                if isinstance(mapping_data, dict):
-                    account = mapping_data.get("account", "")
-
-                    # Verify account exists in our data
-                    if account and account not in excel_accounts:
-                        # Try to find close match
-                        account = self._find_closest_account(account, excel_accounts)
-
-                    clean_mappings[label] = {
-                        "account": account,
-                        "confidence": mapping_data.get("confidence", 0.5),
-                        "reasoning": mapping_data.get("reasoning", "AI matched"),
-                    }
+                mapping = self._clean_mapping(mapping_data, excel_accounts)
+                if mapping is not None:
+                    clean_mappings[label] = mapping
 
             return clean_mappings
 
@@ -319,6 +568,27 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
             print(f"Response was: {ai_response[:500]}")
             return {}
 
+    def _clean_mapping(
+        self, mapping_data, excel_accounts: Dict[str, float]
+    ) -> Optional[Dict]:
+        """Validated mapping from one raw AI entry, or None if malformed"""
+
+        if not isinstance(mapping_data, dict):
+            return None
+
+        account = mapping_data.get("account", "")
+
+        # Verify account exists in our data
+        if account and account not in excel_accounts:
+            # Try to find close match
+            account = self._find_closest_account(account, excel_accounts)
+
+        return {
+            "account": account,
+            "confidence": mapping_data.get("confidence", 0.5),
+            "reasoning": mapping_data.get("reasoning", "AI matched"),
+        }
+
     def _find_closest_account(
         self, account: str, excel_accounts: Dict[str, float]
     ) -> str:
@@ -339,24 +609,24 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
         # No match found
         return ""
 
+    def _fuzzy_index_for(self, excel_accounts: Dict[str, float]) -> FuzzyIndex:
+        """Fuzzy index over excel_accounts, rebuilt only when the accounts change"""
+
+        accounts = list(excel_accounts)
+        with self._fuzzy_index_lock:
+            if self._fuzzy_index is None or self._fuzzy_index.choices != accounts:
+                self._fuzzy_index = FuzzyIndex(accounts)
+            return self._fuzzy_index
+
     def _fallback_fuzzy_match(
         self, template_labels: List[str], excel_accounts: Dict[str, float]
     ) -> List[Dict]:
         """Fallback to simple fuzzy matching if AI fails"""
 
-        from fuzzywuzzy import fuzz
+        matches = self._fuzzy_index_for(excel_accounts).best(template_labels)
 
         results = []
-        for label in template_labels:
-            best_match = None
-            best_score = 0
-
-            for account in excel_accounts.keys():
-                score = fuzz.token_set_ratio(label.lower(), account.lower())
-                if score > best_score:
-                    best_score = score
-                    best_match = account
-
+        for label, (best_match, best_score) in zip(template_labels, matches):
             value = excel_accounts.get(best_match, 0) if best_match else 0
 
             if best_score >= 90:
@@ -433,11 +703,19 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
         return df
 
     def _double_check_uncertain(
-        self, df: pd.DataFrame, excel_accounts: Dict[str, float]
+        self,
+        df: pd.DataFrame,
+        excel_accounts: Dict[str, float],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
     ) -> pd.DataFrame:
         """
         PASS 2: Re-validate uncertain mappings with focused prompts for maximum accuracy.
         Reviews Medium and Low confidence items with additional context.
+
+        Uncertain labels are sent a few per prompt (batch_size, default
+        MAPPER_REVALIDATION_BATCH_SIZE) with the batches in flight at once,
+        and all improvements are written back to the DataFrame in one update.
         """
 
         print("\n=== PASS 2: Double-Check Uncertain Mappings ===")
@@ -445,7 +723,7 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
         # Find items that need double-checking (confidence < High or unmapped)
         uncertain = df[
             (df["Confidence"].isin(["Medium", "Low"])) | (df["Matched Account"] == "")
-        ].copy()
+        ]
 
         if len(uncertain) == 0:
             print("✓ All mappings are high confidence - no double-check needed")
@@ -456,68 +734,82 @@ Now carefully map all {len(template_labels)} labels with maximum accuracy:"""
         )
 
         # Process uncertain items in small focused batches
-        for idx, row in uncertain.iterrows():
-            label = row["Template Label"]
-            current_match = row["Matched Account"]
-            current_conf = row["Score"]
-
-            # Get better match with focused prompt
-            improved_match = self._focused_revalidation(
-                label, current_match, excel_accounts
-            )
-
-            if improved_match:
-                # Update the main dataframe
-                df.at[idx, "Matched Account"] = improved_match["account"]
-                df.at[idx, "Score"] = int(improved_match["confidence"] * 100)
-                df.at[idx, "AI Reasoning"] = (
-                    improved_match["reasoning"] + " [Re-validated]"
+        batch_size = batch_size or self.revalidation_batch_size
+        items = list(
+            zip(uncertain.index, uncertain["Template Label"], uncertain["Matched Account"])
+        )
+        batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(batches)))
+
+        improved: Dict = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    self._focused_revalidation,
+                    [(label, current) for _, label, current in batch],
+                    excel_accounts,
                 )
+                for batch in batches
+            ]
+            for batch, future in zip(batches, futures):
+                for position, mapping in future.result().items():
+                    improved[batch[position][0]] = mapping
+
+        if improved:
+            # Update the main dataframe in one go
+            updates = pd.DataFrame.from_dict(improved, orient="index")
+            new_score = updates["confidence"] * 100
+            updates["Matched Account"] = updates["account"]
+            updates["Score"] = new_score.astype(int)
+            updates["AI Reasoning"] = updates["reasoning"] + " [Re-validated]"
+
+            # Update confidence and status
+            updates["Confidence"] = np.select(
+                [new_score >= 90, new_score >= 70], ["High", "Medium"], "Low"
+            )
+            updates["Status"] = np.select(
+                [new_score >= 90, new_score >= 70], ["✅", "⚠️"], "❌"
+            )
 
-                # Update confidence and status
-                new_score = improved_match["confidence"] * 100
-                if new_score >= 90:
-                    df.at[idx, "Confidence"] = "High"
-                    df.at[idx, "Status"] = "✅"
-                elif new_score >= 70:
-                    df.at[idx, "Confidence"] = "Medium"
-                    df.at[idx, "Status"] = "⚠️"
-                else:
-                    df.at[idx, "Confidence"] = "Low"
-                    df.at[idx, "Status"] = "❌"
+            df.update(
+                updates[["Matched Account", "Score", "AI Reasoning", "Confidence", "Status"]]
+            )
 
         print("✓ Double-check complete - accuracy improved!")
         return df
 
-    def _focused_revalidation(
-        self, label: str, current_match: str, excel_accounts: Dict[str, float]
-    ) -> Optional[Dict]:
-        """
-        Focused re-validation of a single uncertain mapping.
-        Uses a more detailed prompt with additional context.
-        """
-
-        # Get top 10 most relevant accounts for focused analysis
-        from fuzzywuzzy import fuzz
-
-        candidates = []
-        for account, value in excel_accounts.items():
-            score = fuzz.token_set_ratio(label.lower(), account.lower())
-            candidates.append((account, value, score))
+    def _revalidation_candidates(
+        self, label: str, excel_accounts: Dict[str, float]
+    ) -> str:
+        """Top 10 most relevant accounts for focused analysis, as prompt text"""
 
-        # Sort by score and take top 10
-        candidates.sort(key=lambda x: x[2], reverse=True)
-        top_candidates = candidates[:10]
+        top_candidates = [
+            (account, excel_accounts[account], score)
+            for account, score in self._fuzzy_index_for(excel_accounts).top_k(label, 10)
+        ]
 
-        candidates_text = "\n".join(
+        return "\n".join(
             [
                 f"{i + 1}. {acc} (${val:,.2f}) - Text similarity: {score}%"
                 for i, (acc, val, score) in enumerate(top_candidates)
             ]
         )
 
-        prompt = f"""You are doing a SECOND-PASS validation for MAXIMUM ACCURACY.
+    def _focused_revalidation(
+        self, items: List[Tuple[str, str]], excel_accounts: Dict[str, float]
+    ) -> Dict[int, Dict]:
+        """
+        Focused re-validation of a batch of uncertain mappings.
+        Uses a more detailed prompt with additional context per label.
+
+        Args:
+            items: (template label, current match) pairs
+        Returns:
+            Valid improved mappings keyed by position in items
+        """
 
+        items_text = "\n\n".join(
+            f"""=== ITEM {i + 1} ===
 TEMPLATE LABEL TO MAP:
 "{label}"
 
@@ -525,9 +817,17 @@ CURRENT MAPPING (from first pass):
 Account: "{current_match if current_match else "NONE"}"
 
 TOP 10 CANDIDATE ACCOUNTS (sorted by relevance):
-{candidates_text}
+{self._revalidation_candidates(label, excel_accounts)}"""
+            for i, (label, current_match) in enumerate(items)
+        )
 
-YOUR TASK:
+        prompt = f"""You are doing a SECOND-PASS validation for MAXIMUM ACCURACY.
+
+Review each of the {len(items)} items below independently.
+
+{items_text}
+
+YOUR TASK (for every item):
 1. Review the current mapping critically
 2. Consider all candidate accounts
 3. Choose the MOST ACCURATE match based on financial meaning
@@ -539,63 +839,140 @@ CRITICAL QUESTIONS:
 - Should this be a total or a sub-account?
 - Does the value make sense for this type of account?
 
-Return ONLY valid JSON:
+Return ONLY valid JSON keyed by item number:
 {{
-  "account": "Best matching account name (or empty string)",
-  "confidence": 0.XX,
-  "reasoning": "Detailed explanation of why this is correct"
+  "1": {{
+    "account": "Best matching account name (or empty string)",
+    "confidence": 0.XX,
+    "reasoning": "Detailed explanation of why this is correct"
+  }}
 }}"""
 
+        labels = ", ".join(f"'{label}'" for label, _ in items)
         try:
             headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
                 "HTTP-Referer": "http://localhost:8503",
                 "X-Title": "Financial Statement Mapper - Validation Pass",
             }
 
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a senior financial auditor performing accuracy validation. Be extremely critical and precise.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": 0.01,  # Even lower for validation
-                "max_tokens": 2000,
-            }
+            # Pass 2 only sees uncertain labels, so it starts on the larger model
+            model_index = self.scheduler.start_model(self.scheduler.hard_model_index)
+            model = self.models[model_index]
+            messages = [
+                {
+                    "role": "system",
+                    "content": "You are a senior financial auditor performing accuracy validation. Be extremely critical and precise.",
+                },
+                {"role": "user", "content": prompt},
+            ]
+            temperature = 0.01  # Even lower for validation
 
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60,
+            content = (
+                self.response_cache.get(model, temperature, messages)
+                if self.response_cache
+                else None
             )
 
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-
-                # Parse response
-                json_match = re.search(r"\{.*\}", content, re.DOTALL)
-                if json_match:
-                    mapping = json.loads(json_match.group())
+            if content is None:
+                started = time.perf_counter()
+                try:
+                    content = self.http.chat_completion(
+                        model,
+                        messages,
+                        temperature,
+                        timeout=60 + 30 * (len(items) - 1),
+                        headers=headers,
+                        max_tokens=min(2000 * len(items), 16000),
+                    )
+                except Exception:
+                    self.scheduler.record_failure(model_index)
+                    raise
+                # Counts toward reply speed only; review replies are longer
+                # per label than pass-1 entries
+                self.scheduler.record_success(
+                    model_index, 0, time.perf_counter() - started, content
+                )
 
-                    # Verify account exists
-                    account = mapping.get("account", "")
-                    if account and account not in excel_accounts:
-                        account = self._find_closest_account(account, excel_accounts)
-                        mapping["account"] = account
+                if self.response_cache:
+                    self.response_cache.put(model, temperature, messages, content)
 
-                    return mapping
+            # Parse response
+            json_match = re.search(r"\{.*\}", content, re.DOTALL)
+            if json_match:
+                return self._parse_revalidation(
+                    json.loads(json_match.group()), len(items), excel_accounts
+                )
 
         except Exception as e:
-            print(f"   ⚠️  Re-validation failed for '{label}': {e}")
+            print(f"   ⚠️  Re-validation failed for {labels}: {e}")
+
+        return {}
+
+    def _parse_revalidation(
+        self, mappings_raw: Dict, item_count: int, excel_accounts: Dict[str, float]
+    ) -> Dict[int, Dict]:
+        """Keep well-formed per-item mappings from a re-validation response"""
+
+        mappings = {}
+        for key, mapping in mappings_raw.items():
+            try:
+                position = int(key) - 1
+                confidence = float(mapping["confidence"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not 0 <= position < item_count or not np.isfinite(confidence):
+                continue
+
+            # Verify account exists
+            account = mapping.get("account", "") or ""
+            if account and account not in excel_accounts:
+                account = self._find_closest_account(account, excel_accounts)
+
+            mappings[position] = {
+                "account": account,
+                "confidence": confidence,
+                "reasoning": str(mapping.get("reasoning", "")),
+            }
 
-        return None
+        return mappings
+
+
+# Category indexes held by each StructuredMapper worker process
+_worker_indexes: Dict[Optional[str], FuzzyIndex] = {}
+
+
+def _init_structured_worker(indexes: Dict[Optional[str], FuzzyIndex]):
+    """Receive the category indexes once for the lifetime of a worker process"""
+    global _worker_indexes
+    _worker_indexes = indexes
+
+
+def _score_label_group(
+    index: FuzzyIndex, labels: List[str]
+) -> List[Tuple[Optional[str], float]]:
+    """Best (account, combined score) per label among one index's accounts"""
+
+    # Use multiple scoring methods
+    # Weighted average (token_set more important)
+    combined_scores = (index.token_set_ratio(labels) * 0.7) + (
+        index.partial_ratio(labels) * 0.3
+    )
 
+    matches = []
+    for scores in combined_scores:
+        best = int(scores.argmax())  # First account wins ties
+        if scores[best] > 0:
+            matches.append((index.choices[best], float(scores[best])))
+        else:
+            matches.append((None, 0))
+    return matches
+
+
+def _score_label_shard(
+    category: Optional[str], labels: List[str]
+) -> List[Tuple[Optional[str], float]]:
+    """Score a shard of labels against the worker's index for their category"""
+    return _score_label_group(_worker_indexes[category], labels)
 
 
 class StructuredMapper:
@@ -626,6 +1003,9 @@ class StructuredMapper:
             "liability": ["liability", "payable", "loan", "borrowing", "debt"],
             "equity": ["equity", "capital", "retained", "reserve", "share"],
         }
+        # Label counts at or above the threshold are scored in a process pool
+        self.workers = STRUCTURED_MAPPER_WORKERS
+        self.parallel_threshold = STRUCTURED_MAPPER_PARALLEL_THRESHOLD
 
     def categorize_account(self, account_name: str) -> str:
         """Categorize account into financial statement section"""
@@ -639,56 +1019,74 @@ class StructuredMapper:
         return "other"
 
     def create_structured_mappings(
-        self, template_labels: List[str], excel_accounts: Dict[str, float]
+        self,
+        template_labels: List[str],
+        excel_accounts: Dict[str, float],
+        workers: Optional[int] = None,
     ) -> pd.DataFrame:
         """
         Create mappings using financial structure understanding
         More accurate than pure fuzzy matching
         """
 
-        from fuzzywuzzy import fuzz
-
         # Categorize all accounts
-        excel_categorized = {}
-        for account, value in excel_accounts.items():
+        excel_categorized: Dict[str, List[str]] = {}
+        for account in excel_accounts:
             category = self.categorize_account(account)
-            if category not in excel_categorized:
-                excel_categorized[category] = {}
-            excel_categorized[category][account] = value
-
-        results = []
-
-        for label in template_labels:
-            # Categorize label
-            label_category = self.categorize_account(label)
-
-            # Search within same category first
-            candidate_accounts = excel_categorized.get(label_category, {})
-
-            # If no candidates in category, search all
-            if not candidate_accounts:
-                candidate_accounts = excel_accounts
-
-            # Find best match within candidates
-            best_match = None
-            best_score = 0
-
-            for account in candidate_accounts.keys():
-                # Use multiple scoring methods
-                token_score = fuzz.token_set_ratio(label.lower(), account.lower())
-                partial_score = fuzz.partial_ratio(label.lower(), account.lower())
+            excel_categorized.setdefault(category, []).append(account)
+
+        # Categorize labels; each is searched within its category first,
+        # or across all accounts if that category has none (key None)
+        label_categories = [self.categorize_account(label) for label in template_labels]
+        label_groups: Dict[Optional[str], List[int]] = {}
+        for position, label_category in enumerate(label_categories):
+            key = label_category if label_category in excel_categorized else None
+            label_groups.setdefault(key, []).append(position)
+
+        workers = self.workers if workers is None else workers
+        parallel = workers > 1 and len(template_labels) >= self.parallel_threshold
+
+        # Accounts are categorized and processed once per candidate set; in
+        # parallel mode each worker gets its own copy of these indexes
+        indexes = {
+            category: FuzzyIndex(
+                excel_categorized[category] if category else list(excel_accounts),
+                workers=1 if parallel else -1,
+            )
+            for category in label_groups
+        }
 
-                # Weighted average (token_set more important)
-                combined_score = (token_score * 0.7) + (partial_score * 0.3)
+        # Find best match within candidates
+        if parallel:
+            try:
+                best_matches = self._best_matches_parallel(
+                    template_labels, label_groups, indexes, workers
+                )
+            except Exception as e:
+                print(f"⚠️ Parallel scoring failed ({e}), scoring in one process")
+                parallel = False
+        if not parallel:
+            best_matches: List[Tuple[Optional[str], float]] = [(None, 0)] * len(
+                template_labels
+            )
+            for category, positions in label_groups.items():
+                if not indexes[category]:
+                    continue
+                group_labels = [template_labels[position] for position in positions]
+                for position, match in zip(
+                    positions, _score_label_group(indexes[category], group_labels)
+                ):
+                    best_matches[position] = match
 
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_match = account
+        results = []
 
+        for label, label_category, (best_match, best_score) in zip(
+            template_labels, label_categories, best_matches
+        ):
             value = excel_accounts.get(best_match, 0) if best_match else 0
 
             # Adjust confidence based on category match
-            if best_match and self.categorize_account(best_match) == label_category:
+            if best_match and label_category in excel_categorized:
                 best_score = min(100, best_score * 1.1)  # Boost for category match
 
             if best_score >= 85:
@@ -715,6 +1113,50 @@ class StructuredMapper:
 
         return pd.DataFrame(results)
 
+    def _best_matches_parallel(
+        self,
+        template_labels: List[str],
+        label_groups: Dict[Optional[str], List[int]],
+        indexes: Dict[Optional[str], FuzzyIndex],
+        workers: int,
+    ) -> List[Tuple[Optional[str], float]]:
+        """Score label shards in a process pool; results keep label order"""
+
+        # About two shards per worker, never mixing categories in one shard
+        shard_size = max(1, -(-len(template_labels) // (workers * 2)))
+        shards = [
+            (category, positions[start : start + shard_size])
+            for category, positions in label_groups.items()
+            if indexes[category]
+            for start in range(0, len(positions), shard_size)
+        ]
+        print(
+            f"⚙️ Scoring {len(template_labels)} labels in {len(shards)} shards "
+            f"across {workers} processes..."
+        )
+
+        best_matches: List[Tuple[Optional[str], float]] = [(None, 0)] * len(
+            template_labels
+        )
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_structured_worker,
+            initargs=(indexes,),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _score_label_shard,
+                    category,
+                    [template_labels[position] for position in positions],
+                ): positions
+                for category, positions in shards
+            }
+            for future in as_completed(futures):
+                for position, match in zip(futures[future], future.result()):
+                    best_matches[position] = match
+
+        return best_matches
+
     def _validate_and_enhance(
         self, df: pd.DataFrame, excel_accounts: Dict[str, float]
     ) -> pd.DataFrame:
@@ -8,7 +8,8 @@ from typing import Optional
 sys.path.insert(0, str(Path(__file__).parent))
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core.template_analyzer import TemplateAnalyzer
+from core.template_analyzer import TemplateAnalyzer, ANALYZER_VERSION
+from core.template_cache import TemplateCache
 from core.data_handler import DataHandler
 from core.enhanced_ai_processor import EnhancedAIProcessor
 from core.pdf_handler import PDFHandler
@@ -17,7 +18,7 @@ from core.financial_analyzer import FinancialAnalyzer
 from core.quality_assurance import QualityAssurance
 from utils.validators import FileValidator
 from utils.logger import Logger
-from config.settings import ERRORS
+from config.settings import ERRORS, CACHE_ENABLED, TEMPLATE_CACHE_DIR
 
 logger = Logger(__name__)
 
@@ -242,8 +243,13 @@ def step3_generate():
             status_placeholder.text("Initializing...")
             
             status_placeholder.text("Analyzing template...")
-            analyzer = TemplateAnalyzer()
-            coordinate_map = analyzer.analyze_template(
+            template_cache = (
+                TemplateCache(TEMPLATE_CACHE_DIR, ANALYZER_VERSION)
+                if CACHE_ENABLED
+                else None
+            )
+            analyzer = TemplateAnalyzer(cache=template_cache)
+            span_table = analyzer.analyze_template(
                 st.session_state.template_pdf,
                 lambda c, t: update_progress(c, t, f"Template Page {c}/{t}")
             )
@@ -255,10 +261,7 @@ def step3_generate():
                 data_accounts = DataHandler.extract_from_pdf(st.session_state.data_file)
             
             status_placeholder.text("Creating semantic mapping...")
-            template_labels = [
-                elem["text"] for page_elems in coordinate_map.values()
-                for elem in page_elems
-            ]
+            template_labels = span_table.labels()
             
             ai_processor = EnhancedAIProcessor()
             semantic_mapping, confidence_scores = ai_processor.create_enhanced_semantic_mapping(
@@ -277,7 +280,7 @@ def step3_generate():
             status_placeholder.text("Generating PDF...")
             pdf_handler = PDFHandler(st.session_state.template_pdf)
             output_pdf = pdf_handler.generate_output_pdf(
-                coordinate_map,
+                span_table,
                 semantic_mapping,
                 data_accounts,
                 lambda c, t: update_progress(c, t, f"PDF Page {c}/{t}")
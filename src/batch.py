@@ -0,0 +1,260 @@
+"""
+Headless multi-client batch generation.
+
+Runs the step 3 pipeline (analyze, extract, map, validate, analyze,
+generate) for every client workbook in a directory against one template:
+
+    python src/batch.py template.pdf clients/ --output-dir out --workers 8
+
+The template is analyzed once in the parent process; clients are spread
+over a process pool and a JSON run report is written next to the PDFs.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.template_analyzer import TemplateAnalyzer, ANALYZER_VERSION
+from core.template_cache import TemplateCache
+from core.span_table import SpanTable
+from core.data_handler import DataHandler
+from core.enhanced_ai_processor import EnhancedAIProcessor
+from core.pdf_handler import PDFHandler
+from core.financial_validator import FinancialValidator
+from core.financial_analyzer import FinancialAnalyzer
+from utils.logger import Logger
+from config.settings import CACHE_ENABLED, TEMPLATE_CACHE_DIR
+
+logger = Logger(__name__)
+
+CLIENT_EXTENSIONS = {".xlsx", ".xls", ".pdf"}
+
+# Per-process state, set once by _init_worker
+_worker_state: Dict = {}
+
+
+def _init_worker(template_bytes: bytes, span_table: SpanTable):
+    """Load the template and the heavy pipeline objects once per worker."""
+    _worker_state["span_table"] = span_table
+    _worker_state["pdf_handler"] = PDFHandler(template_bytes)
+    _worker_state["ai_processor"] = EnhancedAIProcessor()
+    _worker_state["validator"] = FinancialValidator()
+    _worker_state["analyzer"] = FinancialAnalyzer()
+
+
+def output_name_for(client_file: Path) -> str:
+    """PDF name for a client; the suffix keeps acme.xlsx and acme.pdf apart."""
+    return f"{client_file.stem}_{client_file.suffix[1:].lower()}.pdf"
+
+
+def process_client(client_path: str, output_dir: str) -> Dict:
+    """Run extraction, mapping, validation, analysis and generation for one client."""
+    started = time.perf_counter()
+    client_file = Path(client_path)
+    output_path = Path(output_dir) / output_name_for(client_file)
+    result = {
+        "client": client_file.name,
+        "status": "failed",
+        "output": None,
+        "error": None,
+    }
+
+    try:
+        file_bytes = client_file.read_bytes()
+        if client_file.suffix.lower() == ".pdf":
+            data_accounts = DataHandler.extract_from_pdf(file_bytes)
+        else:
+            data_accounts = DataHandler.extract_from_excel(file_bytes)
+
+        span_table = _worker_state["span_table"]
+        ai_processor = _worker_state["ai_processor"]
+        ai_processor.reset_accuracy_metrics()
+        semantic_mapping, confidence_scores = (
+            ai_processor.create_enhanced_semantic_mapping(
+                span_table.labels(), data_accounts
+            )
+        )
+
+        _, validation_summary = _worker_state[
+            "validator"
+        ].validate_financial_statement(data_accounts)
+        analysis_results = _worker_state["analyzer"].perform_comprehensive_analysis(
+            data_accounts
+        )
+
+        pdf_handler = _worker_state["pdf_handler"]
+        pdf_handler.generate_output_pdf(
+            span_table, semantic_mapping, data_accounts, output=output_path
+        )
+
+        quality_report = ai_processor.get_quality_report()
+        result.update(
+            {
+                "status": "ok",
+                "output": str(output_path),
+                "accounts_extracted": len(data_accounts),
+                "labels_mapped": len(semantic_mapping),
+                "average_confidence": (
+                    sum(confidence_scores.values()) / len(confidence_scores)
+                    if confidence_scores
+                    else 0
+                ),
+                "quality_grade": quality_report.get("quality_grade"),
+                "validation_passed": validation_summary.get("passed_checks", 0),
+                "validation_failed": validation_summary.get("failed_checks", 0),
+                "insights": len(analysis_results.get("insights", [])),
+                "pdf_stats": dict(pdf_handler.last_stats),
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Batch client {client_file.name} failed: {str(e)}")
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def find_client_files(clients_dir: Path) -> List[Path]:
+    """Return client workbooks (and PDF data files) in name order."""
+    return sorted(
+        path
+        for path in clients_dir.iterdir()
+        if path.is_file()
+        and path.suffix.lower() in CLIENT_EXTENSIONS
+        and not path.name.startswith("~$")
+    )
+
+
+def run_batch(
+    template_path: Path,
+    clients_dir: Path,
+    output_dir: Path,
+    workers: Optional[int] = None,
+    report_path: Optional[Path] = None,
+) -> Dict:
+    """Generate statements for every client file and write a JSON report."""
+    # Outputs are PDFs, which would be read back as client files next run
+    if output_dir.resolve() == clients_dir.resolve():
+        raise ValueError(
+            f"Output directory {output_dir} must differ from the clients directory"
+        )
+
+    started_at = datetime.now()
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    output_dir.mkdir(parents=True, exist_ok=True)
+    report_path = report_path or output_dir / "batch_report.json"
+
+    template_bytes = template_path.read_bytes()
+    template_cache = (
+        TemplateCache(TEMPLATE_CACHE_DIR, ANALYZER_VERSION) if CACHE_ENABLED else None
+    )
+    span_table = TemplateAnalyzer(cache=template_cache).analyze_template(
+        template_bytes
+    )
+    template_seconds = time.perf_counter() - started
+
+    client_files = find_client_files(clients_dir)
+    logger.info(
+        f"Batch: {len(client_files)} clients, {workers} workers, "
+        f"template analyzed in {template_seconds:.2f}s"
+    )
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(template_bytes, span_table),
+    ) as executor:
+        futures = [
+            executor.submit(process_client, str(path), str(output_dir))
+            for path in client_files
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            logger.info(
+                f"[{done}/{len(futures)}] {result['client']}: {result['status']} "
+                f"({result['seconds']:.1f}s)"
+            )
+
+    results.sort(key=lambda r: r["client"])
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+
+    report = {
+        "template": str(template_path),
+        "template_spans": len(span_table),
+        "template_seconds": round(template_seconds, 3),
+        "clients_dir": str(clients_dir),
+        "output_dir": str(output_dir),
+        "workers": workers,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_seconds": round(elapsed, 3),
+        "summary": {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "clients_per_hour": round(len(results) / elapsed * 3600, 1)
+            if elapsed
+            else 0,
+        },
+        "clients": results,
+    }
+
+    report_path.write_text(json.dumps(report, indent=2, default=str))
+    logger.info(
+        f"Batch finished: {succeeded}/{len(results)} succeeded in {elapsed:.1f}s, "
+        f"report: {report_path}"
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Generate financial statements for many clients from one template."
+    )
+    parser.add_argument("template", type=Path, help="Template PDF")
+    parser.add_argument(
+        "clients_dir", type=Path, help="Directory of client workbooks (.xlsx/.xls/.pdf)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path("output"),
+        help="Directory for generated PDFs (default: output)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        help="JSON run report path (default: <output-dir>/batch_report.json)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_batch(
+            args.template, args.clients_dir, args.output_dir, args.workers, args.report
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    return 0 if report["summary"]["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
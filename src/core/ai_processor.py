@@ -2,6 +2,8 @@ import json
 import requests
 from typing import Dict, List, Tuple
 from utils.logger import Logger
+from utils.http_client import OpenRouterError, default_http_client
+from utils.llm_cache import default_llm_cache
 from config.settings import (
     OPENROUTER_API_KEY,
     OPENROUTER_BASE_URL,
@@ -22,6 +24,8 @@ class AIProcessor:
         self.api_key = OPENROUTER_API_KEY
         self.base_url = OPENROUTER_BASE_URL
         self.model = TEXT_MODEL
+        self.http = default_http_client()
+        self.response_cache = default_llm_cache()
 
     def create_semantic_mapping(
         self, template_labels: List[str], data_accounts: Dict[str, float]
@@ -70,30 +74,26 @@ Do not include any other text."""
     def _call_api(self, prompt: str) -> str:
         """Call OpenRouter API with the prompt."""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-            }
-
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=API_TIMEOUT_SECONDS,
-            )
-
-            if response.status_code != 200:
-                logger.error(f"API error {response.status_code}: {response.text}")
+            messages = [{"role": "user", "content": prompt}]
+            temperature = 0.3
+
+            # Repeat prompts are answered from the response cache
+            if self.response_cache:
+                cached = self.response_cache.get(self.model, temperature, messages)
+                if cached is not None:
+                    return cached
+
+            try:
+                content = self.http.chat_completion(
+                    self.model, messages, temperature, timeout=API_TIMEOUT_SECONDS
+                )
+            except OpenRouterError as e:
+                logger.error(str(e))
                 raise Exception(ERRORS["api_failure"])
 
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            if self.response_cache:
+                self.response_cache.put(self.model, temperature, messages, content)
+            return content
 
         except requests.Timeout:
             timeout_msg = (
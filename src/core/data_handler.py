@@ -4,9 +4,15 @@ import pandas as pd
 from typing import Dict, List, Tuple
 from openpyxl import load_workbook
 from utils.logger import Logger
+from utils.excel_parsing import extract_accounts, column_position
+from utils.excel_streaming import iter_sheets
+from config.settings import EXCEL_STREAMING_THRESHOLD_MB
 
 logger = Logger(__name__)
 
+# Account-column values that are headers rather than accounts
+HEADER_LABELS = ["particulars", "account", "description", "nan"]
+
 
 class DataHandler:
     @staticmethod
@@ -15,81 +21,46 @@ class DataHandler:
         try:
             excel_file = io.BytesIO(file_bytes)
 
-            # Try with pandas first for better format detection
+            # Large workbooks are streamed sheet-by-sheet instead of loaded whole
+            streaming = len(file_bytes) >= EXCEL_STREAMING_THRESHOLD_MB * 1024 * 1024
+            method = "streaming" if streaming else "pandas"
+
+            # Try the multi-sheet year-column readers first
             try:
-                df = pd.read_excel(excel_file, sheet_name=None)  # Read all sheets
-                data_map = {}
+                if streaming:
+                    data_map = DataHandler._extract_excel_streaming(file_bytes)
+                else:
+                    data_map = DataHandler._extract_excel_pandas(excel_file)
 
-                # Try to find financial data in any sheet
-                for sheet_name, sheet_df in df.items():
-                    # Skip sheets with very little data
-                    if len(sheet_df) < 5:
-                        continue
-
-                    # Look for year columns (like 2024.0, 2025.0) or numeric headers
-                    potential_value_cols = []
-                    for col in sheet_df.columns:
-                        # Check if column name looks like a year or is numeric
-                        col_str = str(col)
-                        if col_str.replace(".", "").replace("-", "").isdigit():
-                            potential_value_cols.append(col)
-
-                    # If we found year columns, extract data
-                    if potential_value_cols:
-                        # Get the first column as account names
-                        account_col = sheet_df.columns[0]
-                        # Use the first numeric column (usually most recent year)
-                        value_col = potential_value_cols[0]
-
-                        for idx, row in sheet_df.iterrows():
-                            account_name = row[account_col]
-                            value = row[value_col]
-
-                            if pd.notna(account_name) and pd.notna(value):
-                                # Skip header-like rows
-                                if str(account_name).lower() in [
-                                    "particulars",
-                                    "account",
-                                    "description",
-                                    "nan",
-                                ]:
-                                    continue
-
-                                # Try to convert value to float
-                                try:
-                                    float_value = float(value)
-                                    if float_value != 0:  # Skip zero values
-                                        data_map[str(account_name).strip()] = (
-                                            float_value
-                                        )
-                                except (ValueError, TypeError):
-                                    continue
-
-                # If pandas method found data, return it
+                # If the year-column method found data, return it
                 if data_map:
                     logger.info(
-                        f"Extracted {len(data_map)} data points from Excel (pandas method)"
+                        f"Extracted {len(data_map)} data points from Excel ({method} method)"
                     )
                     return data_map
 
             except Exception as e:
-                logger.warning(f"Pandas extraction failed, trying openpyxl: {e}")
+                logger.warning(f"{method.capitalize()} extraction failed, trying openpyxl: {e}")
 
             # Fallback to original openpyxl method for simple two-column format
             excel_file.seek(0)  # Reset file pointer
-            workbook = load_workbook(excel_file)
-            sheet = workbook.active
-
-            data_map = {}
-            for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row):
-                if len(row) >= 2:
-                    account_name = row[0].value
-                    value = row[1].value
+            workbook = load_workbook(excel_file, read_only=streaming)
+            try:
+                sheet = workbook.active
 
-                    if account_name and isinstance(value, (int, float)):
-                        account_name_str = str(account_name).strip()
-                        if value != 0:  # Skip zero values
-                            data_map[account_name_str] = float(value)
+                data_map = {}
+                for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row):
+                    if len(row) >= 2:
+                        account_name = row[0].value
+                        value = row[1].value
+
+                        if account_name and isinstance(value, (int, float)):
+                            account_name_str = str(account_name).strip()
+                            if value != 0:  # Skip zero values
+                                data_map[account_name_str] = float(value)
+            finally:
+                # A read-only workbook holds its zip archive open until closed
+                workbook.close()
 
             logger.info(
                 f"Extracted {len(data_map)} data points from Excel (openpyxl method)"
@@ -100,6 +71,68 @@ class DataHandler:
             logger.error(f"Failed to extract Excel data: {str(e)}")
             raise
 
+    @staticmethod
+    def _is_value_column(column) -> bool:
+        """Check if a column name looks like a year or is numeric (2024.0, 2025)."""
+        col_str = str(column)
+        return col_str.replace(".", "").replace("-", "").isdigit()
+
+    @staticmethod
+    def _extract_excel_pandas(excel_file: io.BytesIO) -> Dict[str, float]:
+        """Read every sheet with pandas and pull accounts from year columns."""
+        df = pd.read_excel(excel_file, sheet_name=None)  # Read all sheets
+        data_map = {}
+
+        # Try to find financial data in any sheet
+        for sheet_name, sheet_df in df.items():
+            # Skip sheets with very little data
+            if len(sheet_df) < 5:
+                continue
+
+            # Look for year columns (like 2024.0, 2025.0) or numeric headers
+            potential_value_cols = [
+                col for col in sheet_df.columns if DataHandler._is_value_column(col)
+            ]
+
+            # If we found year columns, extract data
+            if potential_value_cols:
+                # First column holds account names; use the first numeric
+                # column (usually most recent year)
+                value_col = potential_value_cols[0]
+
+                # Whole-column parse; same rules as a row-by-row loop
+                data_map.update(
+                    extract_accounts(
+                        sheet_df.iloc[:, 0],
+                        sheet_df.iloc[:, column_position(sheet_df.columns, value_col)],
+                        HEADER_LABELS,
+                    )
+                )
+
+        return data_map
+
+    @staticmethod
+    def _extract_excel_streaming(file_bytes: bytes) -> Dict[str, float]:
+        """Same rules as _extract_excel_pandas, reading rows lazily per sheet."""
+        data_map = {}
+
+        for sheet in iter_sheets(file_bytes):
+            # Skip sheets with very little data
+            if len(sheet.peek(5)) < 5:
+                continue
+
+            potential_value_cols = [
+                col for col in sheet.columns if DataHandler._is_value_column(col)
+            ]
+            if not potential_value_cols:
+                continue
+
+            value_position = column_position(sheet.columns, potential_value_cols[0])
+            for names, values in sheet.column_chunks([0, value_position]):
+                data_map.update(extract_accounts(names, values, HEADER_LABELS))
+
+        return data_map
+
     @staticmethod
     def extract_from_pdf(file_bytes: bytes) -> Dict[str, float]:
         """Extract account names and values from PDF table/text."""
@@ -1,7 +1,8 @@
 import json
-import requests
 from typing import Dict, List, Tuple, Optional, Set
 from utils.logger import Logger
+from utils.http_client import default_http_client
+from utils.llm_cache import default_llm_cache
 from config.settings import (
     OPENROUTER_API_KEY,
     OPENROUTER_BASE_URL,
@@ -9,7 +10,7 @@ from config.settings import (
     API_TIMEOUT_SECONDS,
     ERRORS,
 )
-from .knowledge_extractor import KnowledgeExtractor
+from .knowledge_extractor import default_knowledge_base
 
 logger = Logger(__name__)
 
@@ -25,7 +26,13 @@ class EnhancedAIProcessor:
         self.api_key = OPENROUTER_API_KEY
         self.base_url = OPENROUTER_BASE_URL
         self.model = TEXT_MODEL
-        self.knowledge_base = KnowledgeExtractor()
+        self.http = default_http_client()
+        self.response_cache = default_llm_cache()
+        self.knowledge_base = default_knowledge_base()
+        self.reset_accuracy_metrics()
+
+    def reset_accuracy_metrics(self):
+        """Clear per-session metrics so one processor can serve many runs."""
         self.accuracy_metrics = {
             "total_mappings": 0,
             "knowledge_only_matches": 0,
@@ -103,10 +110,13 @@ class EnhancedAIProcessor:
         mapping = {}
         confidence_scores = {}
 
+        # All labels in one pass over the label x account matrix
+        all_suggestions = self.knowledge_base.suggest_mappings(
+            template_labels, data_accounts
+        )
+
         for label in template_labels:
-            suggestions = self.knowledge_base.suggest_mapping_for_label(
-                label, data_accounts
-            )
+            suggestions = all_suggestions[label]
 
             if suggestions:
                 # Use top suggestion with high confidence for exact matches
@@ -306,35 +316,31 @@ Return ONLY valid JSON in this format:
 If no suitable match exists, use "NO_MATCH" for that label."""
 
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a financial accounting expert specialized in mapping financial statement labels to data accounts.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": 0.1,  # Lower temperature for more precise mapping
-            }
-
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=API_TIMEOUT_SECONDS,
+            messages = [
+                {
+                    "role": "system",
+                    "content": "You are a financial accounting expert specialized in mapping financial statement labels to data accounts.",
+                },
+                {"role": "user", "content": prompt},
+            ]
+            temperature = 0.1  # Lower temperature for more precise mapping
+
+            # Repeat prompts are answered from the response cache
+            llm_response = (
+                self.response_cache.get(self.model, temperature, messages)
+                if self.response_cache
+                else None
             )
 
-            if response.status_code != 200:
-                raise Exception(f"API error {response.status_code}")
+            if llm_response is None:
+                llm_response = self.http.chat_completion(
+                    self.model, messages, temperature, timeout=API_TIMEOUT_SECONDS
+                )
 
-            result = response.json()
-            llm_response = result["choices"][0]["message"]["content"]
+                if self.response_cache:
+                    self.response_cache.put(
+                        self.model, temperature, messages, llm_response
+                    )
 
             # Parse JSON from LLM response
             json_start = llm_response.find("{")
@@ -2,8 +2,8 @@ import statistics
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import dataclass
 from utils.logger import Logger
-from .knowledge_extractor import KnowledgeExtractor
-from .financial_validator import AnalysisResult
+from .knowledge_extractor import default_knowledge_base
+from .financial_validator import AnalysisResult, FinancialValidator
 
 logger = Logger(__name__)
 
@@ -43,7 +43,9 @@ class FinancialAnalyzer:
     """Comprehensive financial analysis and benchmarking."""
     
     def __init__(self):
-        self.knowledge_base = KnowledgeExtractor()
+        self.knowledge_base = default_knowledge_base()
+        # Reused for ratio calculations instead of one per analysis
+        self.validator = FinancialValidator()
         self.industry_benchmarks = self._initialize_industry_benchmarks()
         self.analysis_thresholds = self._initialize_analysis_thresholds()
     
@@ -108,9 +110,7 @@ class FinancialAnalyzer:
         
         try:
             # Calculate financial ratios
-            from .financial_validator import FinancialValidator
-            validator = FinancialValidator()
-            ratios = validator._calculate_financial_ratios(data)
+            ratios = self.validator._calculate_financial_ratios(data)
             analysis_results['financial_ratios'] = ratios
             
             # Benchmark comparisons
@@ -2,7 +2,7 @@ import math
 from typing import Dict, List, Tuple, Optional, Union
 from dataclasses import dataclass
 from utils.logger import Logger
-from .knowledge_extractor import KnowledgeExtractor
+from .knowledge_extractor import default_knowledge_base
 
 logger = Logger(__name__)
 
@@ -44,7 +44,7 @@ class FinancialValidator:
     """Comprehensive financial validation and compliance checking."""
 
     def __init__(self):
-        self.knowledge_base = KnowledgeExtractor()
+        self.knowledge_base = default_knowledge_base()
         self.validation_rules = self._initialize_validation_rules()
         self.compliance_standards = self._initialize_compliance_standards()
 
@@ -149,7 +149,7 @@ class FinancialValidator:
         )
 
         # Get relevant validation rules
-        rules = self.validation_rules.get(statement_type, [])
+        rules = list(self.validation_rules.get(statement_type, []))
         if statement_type == "income_statement":
             rules.extend(self.validation_rules.get("ratios", []))
 
@@ -1,37 +1,183 @@
+import numpy as np
 import pandas as pd
 import json
 import re
+import threading
+from functools import lru_cache
 from typing import Dict, List, Set, Tuple, Optional
 from pathlib import Path
+from config.settings import CACHE_ENABLED
 from utils.logger import Logger
+from .knowledge_snapshot import (
+    COMPONENTS,
+    KnowledgeSnapshot,
+    open_snapshot,
+    write_snapshot,
+)
+from .synonym_graph import SynonymGraph
+from .term_index import TermIndex
 
 logger = Logger(__name__)
 
+# Distinct account names whose normalized form is remembered
+NORMALIZE_CACHE_SIZE = 65536
+
+# Labels scored per label x account matrix in suggest_mappings
+SUGGEST_LABEL_CHUNK = 256
+
+# Common financial term variations, by canonical term
+COMMON_TERM_VARIATIONS = {
+    "revenue": ["total revenue", "sales", "turnover", "gross revenue"],
+    "net income": ["net profit", "net earnings", "bottom line"],
+    "assets": ["total assets", "gross assets"],
+    "liabilities": ["total liabilities"],
+    "equity": ["shareholders equity", "owner equity", "net worth"],
+    "cash": ["cash and equivalents", "cash on hand"],
+    "expenses": ["total expenses", "operating expenses"],
+    "operating income": ["ebit", "operating profit"],
+    "gross profit": ["gross margin", "gross earnings"],
+}
 
-class KnowledgeExtractor:
-    """Extracts and integrates financial knowledge from various knowledge bases."""
 
-    def __init__(self, knowledge_base_path: str = "Finance Knowledge"):
+class KnowledgeExtractor:
+    """Extracts and integrates financial knowledge from various knowledge bases.
+
+    Each component (xbrl_terms, financial_formulas, benchmarks,
+    account_synonyms, term_index, xbrl_index, synonym_graph) is loaded on
+    first access, from the precompiled snapshot when it is current. Instances are safe to share between
+    threads; default_knowledge_base() returns the process-wide one.
+    """
+
+    # Source loader per component
+    _LOADERS = {
+        "xbrl_terms": "_load_xbrl_terminology",
+        "financial_formulas": "_load_financial_formulas",
+        "benchmarks": "_load_benchmarks",
+        "account_synonyms": "_build_synonym_mapping",
+        "term_index": "_build_term_index",
+        "xbrl_index": "_build_xbrl_index",
+        "synonym_graph": "_build_synonym_graph",
+    }
+
+    def __init__(
+        self,
+        knowledge_base_path: str = "Finance Knowledge",
+        use_snapshot: bool = CACHE_ENABLED,
+    ):
         self.knowledge_path = Path(knowledge_base_path)
-        self.xbrl_terms = {}
-        self.financial_formulas = {}
-        self.benchmarks = {}
-        self.account_synonyms = {}
-        self._load_knowledge_bases()
+        self.use_snapshot = use_snapshot
+        self._components: Dict[str, Dict] = {}
+        self._snapshot: Optional[KnowledgeSnapshot] = None
+        self._snapshot_checked = False
+        # Re-entrant: the synonym map is built from xbrl_terms
+        self._lock = threading.RLock()
+        self._reset_normalize_cache()
+
+    @property
+    def xbrl_terms(self) -> Dict[str, Dict]:
+        return self._component("xbrl_terms")
+
+    @property
+    def financial_formulas(self) -> Dict[str, Dict]:
+        return self._component("financial_formulas")
+
+    @property
+    def benchmarks(self) -> Dict[str, List[Dict]]:
+        return self._component("benchmarks")
+
+    @property
+    def account_synonyms(self) -> Dict[str, str]:
+        return self._component("account_synonyms")
+
+    @property
+    def term_index(self) -> TermIndex:
+        return self._component("term_index")
+
+    @property
+    def xbrl_index(self) -> TermIndex:
+        return self._component("xbrl_index")
+
+    @property
+    def synonym_graph(self) -> SynonymGraph:
+        return self._component("synonym_graph")
+
+    def _component(self, name: str) -> Dict:
+        value = self._components.get(name)
+        if value is None:
+            with self._lock:
+                value = self._components.get(name)
+                if value is None:
+                    value = self._components[name] = self._load_component(name)
+        return value
+
+    def _load_component(self, name: str) -> Dict:
+        """Load one component, from the snapshot when it is current."""
+        snapshot = self._open_snapshot()
+        if name in self._components:  # Filled by a full load from the workbooks
+            return self._components[name]
+        if snapshot is not None:
+            try:
+                return snapshot.load(name)
+            except Exception as e:
+                logger.warning(f"Knowledge snapshot unreadable, loading workbooks: {e}")
+
+        return getattr(self, self._LOADERS[name])()
+
+    def _open_snapshot(self) -> Optional[KnowledgeSnapshot]:
+        """The current snapshot, rebuilding it once if it is missing or stale."""
+        if not self.use_snapshot or self._snapshot_checked:
+            return self._snapshot
+        self._snapshot_checked = True
+
+        self._snapshot = open_snapshot(self.knowledge_path)
+        if self._snapshot is None:
+            # One full load from the workbooks, then every start after
+            # this one reads the snapshot
+            self._load_knowledge_bases()
+            self._snapshot = open_snapshot(self.knowledge_path)
+        else:
+            logger.info(f"Knowledge bases mapped from snapshot {self._snapshot.path}")
+        return self._snapshot
 
     def _load_knowledge_bases(self):
-        """Load all knowledge base files."""
+        """Load all knowledge base files and snapshot a complete load."""
         try:
-            self._load_xbrl_terminology()
-            self._load_financial_formulas()
-            self._load_benchmarks()
-            self._build_synonym_mapping()
+            for name in COMPONENTS:
+                self._components[name] = getattr(self, self._LOADERS[name])()
             logger.info("Knowledge bases loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load knowledge bases: {e}")
+            return
 
-    def _load_xbrl_terminology(self):
+        if all(self._components.get(name) for name in COMPONENTS):
+            try:
+                write_snapshot(
+                    self.knowledge_path,
+                    {name: self._components[name] for name in COMPONENTS},
+                )
+            except Exception as e:
+                logger.warning(f"Could not write knowledge snapshot: {e}")
+
+    def reload(self):
+        """Drop loaded components; the next access reads the sources again."""
+        with self._lock:
+            self._components = {}
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = None
+            self._snapshot_checked = False
+            self._reset_normalize_cache()
+        logger.info("Knowledge base will be reloaded on next use")
+
+    def _reset_normalize_cache(self):
+        # Labels and the same client's accounts are normalized over and over
+        self._normalize_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(
+            self._normalize_account_name
+        )
+
+    def _load_xbrl_terminology(self) -> Dict[str, Dict]:
         """Load XBRL standardized financial terminology."""
+        xbrl_terms = {}
         try:
             file_path = self.knowledge_path / "xbrl-terminology.xlsx"
             df = pd.read_excel(file_path)
@@ -40,18 +186,20 @@ class KnowledgeExtractor:
                 term = str(row["Term"]).strip().lower()
                 explanation = str(row["Explanation"]).strip()
 
-                self.xbrl_terms[term] = {
+                xbrl_terms[term] = {
                     "definition": explanation,
                     "category": self._categorize_term(term),
                     "synonyms": self._extract_synonyms_from_explanation(explanation),
                 }
 
-            logger.info(f"Loaded {len(self.xbrl_terms)} XBRL terms")
+            logger.info(f"Loaded {len(xbrl_terms)} XBRL terms")
         except Exception as e:
             logger.error(f"Failed to load XBRL terminology: {e}")
+        return xbrl_terms
 
-    def _load_financial_formulas(self):
+    def _load_financial_formulas(self) -> Dict[str, Dict]:
         """Load financial formulas with explanations."""
+        financial_formulas = {}
         try:
             file_path = (
                 self.knowledge_path
@@ -64,19 +212,21 @@ class KnowledgeExtractor:
                 formula = str(row["Formula"]).strip()
                 explanation = str(row["Explanation"]).strip()
 
-                self.financial_formulas[formula_name] = {
+                financial_formulas[formula_name] = {
                     "formula": formula,
                     "explanation": explanation,
                     "components": self._extract_formula_components(formula),
                     "category": self._categorize_formula(formula_name),
                 }
 
-            logger.info(f"Loaded {len(self.financial_formulas)} financial formulas")
+            logger.info(f"Loaded {len(financial_formulas)} financial formulas")
         except Exception as e:
             logger.error(f"Failed to load financial formulas: {e}")
+        return financial_formulas
 
-    def _load_benchmarks(self):
+    def _load_benchmarks(self) -> Dict[str, List[Dict]]:
         """Load financial benchmarking data."""
+        benchmarks = {}
         try:
             file_path = self.knowledge_path / "financebench.xlsx"
             df = pd.read_excel(file_path)
@@ -87,10 +237,10 @@ class KnowledgeExtractor:
                 question = str(row["question"]).strip()
                 answer = str(row["answer"]).strip()
 
-                if q_type not in self.benchmarks:
-                    self.benchmarks[q_type] = []
+                if q_type not in benchmarks:
+                    benchmarks[q_type] = []
 
-                self.benchmarks[q_type].append(
+                benchmarks[q_type].append(
                     {
                         "question": question,
                         "answer": answer,
@@ -98,11 +248,10 @@ class KnowledgeExtractor:
                     }
                 )
 
-            logger.info(
-                f"Loaded benchmark data for {len(self.benchmarks)} question types"
-            )
+            logger.info(f"Loaded benchmark data for {len(benchmarks)} question types")
         except Exception as e:
             logger.error(f"Failed to load benchmark data: {e}")
+        return benchmarks
 
     def _categorize_term(self, term: str) -> str:
         """Categorize XBRL terms into financial statement categories."""
@@ -186,32 +335,55 @@ class KnowledgeExtractor:
 
         return patterns
 
-    def _build_synonym_mapping(self):
+    def _build_synonym_mapping(self) -> Dict[str, str]:
         """Build comprehensive synonym mapping from all sources."""
+        account_synonyms = {}
         # Base XBRL terms
         for term, info in self.xbrl_terms.items():
-            self.account_synonyms[term] = term
+            account_synonyms[term] = term
             for synonym in info.get("synonyms", []):
-                self.account_synonyms[synonym] = term
+                account_synonyms[synonym] = term
 
         # Add common financial term variations
-        common_mappings = {
-            "revenue": ["total revenue", "sales", "turnover", "gross revenue"],
-            "net income": ["net profit", "net earnings", "bottom line"],
-            "assets": ["total assets", "gross assets"],
-            "liabilities": ["total liabilities"],
-            "equity": ["shareholders equity", "owner equity", "net worth"],
-            "cash": ["cash and equivalents", "cash on hand"],
-            "expenses": ["total expenses", "operating expenses"],
-            "operating income": ["ebit", "operating profit"],
-            "gross profit": ["gross margin", "gross earnings"],
-        }
-
-        for canonical, variations in common_mappings.items():
+        for canonical, variations in COMMON_TERM_VARIATIONS.items():
             for variation in variations:
-                self.account_synonyms[variation.lower()] = canonical.lower()
+                account_synonyms[variation.lower()] = canonical.lower()
+
+        logger.info(f"Built synonym mapping with {len(account_synonyms)} terms")
+        return account_synonyms
+
+    def _build_term_index(self) -> TermIndex:
+        """Index the synonym terms for partial matching, in synonym-map order."""
+        return TermIndex(self.account_synonyms)
+
+    def _build_xbrl_index(self) -> TermIndex:
+        """Index the XBRL terms for finding the ones inside a label."""
+        return TermIndex(self.xbrl_terms)
+
+    def _build_synonym_graph(self) -> SynonymGraph:
+        """Link XBRL terms and common variations to their synonyms.
+
+        Synonyms pulled from explanation text are mostly stray words
+        ("and", "that", "item"), so they only link their own term unless
+        they are multi-word XBRL terms themselves.
+        """
+        links = [
+            (canonical.lower(), variation.lower())
+            for canonical, variations in COMMON_TERM_VARIATIONS.items()
+            for variation in variations
+        ]
+        loose_links = []
+        for term, info in self.xbrl_terms.items():
+            for synonym in info.get("synonyms", []):
+                # Single words ("item", "balance") are too generic to chain
+                if " " in synonym and synonym in self.xbrl_terms:
+                    links.append((term, synonym))
+                else:
+                    loose_links.append((term, synonym))
 
-        logger.info(f"Built synonym mapping with {len(self.account_synonyms)} terms")
+        graph = SynonymGraph(links, loose_links)
+        logger.info(f"Built synonym graph over {len(graph)} terms")
+        return graph
 
     def get_term_definition(self, term: str) -> Optional[str]:
         """Get definition for a financial term."""
@@ -219,33 +391,29 @@ class KnowledgeExtractor:
         return self.xbrl_terms.get(term_normalized, {}).get("definition")
 
     def get_synonyms(self, term: str) -> List[str]:
-        """Get all synonyms for a term."""
-        synonyms = []
-        term_normalized = term.lower().strip()
-
-        for canonical_term, info in self.xbrl_terms.items():
-            if canonical_term == term_normalized:
-                synonyms.extend(info.get("synonyms", []))
-            elif term_normalized in info.get("synonyms", []):
-                synonyms.append(canonical_term)
-                synonyms.extend(
-                    [s for s in info.get("synonyms", []) if s != term_normalized]
-                )
+        """Get all synonyms for a term, transitively through the synonym graph."""
+        return list(self.synonym_graph.synonyms(term.lower().strip()))
 
-        return list(set(synonyms))
+    def expand_term(self, term: str) -> List[str]:
+        """The normalized term followed by all its synonyms."""
+        return list(self.synonym_graph.expand(term.lower().strip()))
 
     def normalize_account_name(self, account_name: str) -> str:
-        """Normalize account name to standard terminology."""
+        """Normalize account name to standard terminology (memoized)."""
+        return self._normalize_cached(account_name)
+
+    def _normalize_account_name(self, account_name: str) -> str:
         normalized = account_name.lower().strip()
 
         # Direct synonym mapping
         if normalized in self.account_synonyms:
             return self.account_synonyms[normalized]
 
-        # Partial matching for longer phrases
-        for term, canonical in self.account_synonyms.items():
-            if term in normalized or normalized in term:
-                return canonical
+        # Partial matching for longer phrases: the first term, in synonym
+        # map order, that is inside the name or contains it
+        rank = self.term_index.first_match(normalized)
+        if rank is not None:
+            return self.account_synonyms[self.term_index.terms[rank]]
 
         return normalized
 
@@ -314,39 +482,102 @@ class KnowledgeExtractor:
         self, label: str, data_accounts: List[str]
     ) -> List[str]:
         """Suggest mapping for a single label based on knowledge base."""
-        normalized_label = self.normalize_account_name(label)
-        suggestions = []
-
-        # Direct synonym matches
-        for account in data_accounts:
-            normalized_account = self.normalize_account_name(account)
-            if normalized_label == normalized_account:
-                suggestions.append(account)
-                continue
-
-            # Partial matches for longer phrases
-            if any(
-                word in normalized_account.split() for word in normalized_label.split()
-            ):
-                suggestions.append(account)
-
-        # XBRL term matches
-        for term, info in self.xbrl_terms.items():
-            if term in normalized_label.lower():
-                for account in data_accounts:
-                    if term in account.lower() and account not in suggestions:
-                        suggestions.append(account)
-
-        # Remove duplicates and limit to top 3 suggestions
-        return list(dict.fromkeys(suggestions))[:3]
+        return self.suggest_mappings([label], data_accounts).get(label, [])
 
     def suggest_mappings(
-        self, template_labels: List[str], data_accounts: List[str]
+        self, template_labels: List[str], data_accounts: List[str], limit: int = 3
     ) -> Dict[str, List[str]]:
-        """Suggest mappings based on knowledge base (without LLM)."""
-        suggestions = {}
+        """Suggest mappings based on knowledge base (without LLM).
+
+        Per label, accounts whose normalized name equals the label's or
+        shares a word with it come first, in account order; then accounts
+        containing an XBRL term found in the normalized label, by term.
+        Labels and accounts are normalized and tokenized once, and the
+        word overlap for all labels is one matrix product.
+        """
+        labels = list(dict.fromkeys(template_labels))
+        accounts = list(dict.fromkeys(data_accounts))
+        if not accounts:
+            return {label: [] for label in labels}
+
+        label_names = [self.normalize_account_name(label) for label in labels]
+        account_names = [self.normalize_account_name(account) for account in accounts]
+
+        # Label x word and word x account incidence over the labels' words
+        vocabulary: Dict[str, int] = {}
+        label_words = [
+            [vocabulary.setdefault(word, len(vocabulary)) for word in set(name.split())]
+            for name in label_names
+        ]
+        label_matrix = np.zeros((len(labels), len(vocabulary) or 1), dtype=np.float32)
+        for row, words in enumerate(label_words):
+            label_matrix[row, words] = 1
+        account_matrix = np.zeros((len(vocabulary) or 1, len(accounts)), dtype=np.float32)
+        for column, name in enumerate(account_names):
+            words = [vocabulary[word] for word in set(name.split()) if word in vocabulary]
+            account_matrix[words, column] = 1
+
+        name_ids: Dict[str, int] = {}
+        label_ids = np.array(
+            [name_ids.setdefault(name, len(name_ids)) for name in label_names]
+        )
+        account_ids = np.array([name_ids.get(name, -1) for name in account_names])
 
-        for label in template_labels:
-            suggestions[label] = self.suggest_mapping_for_label(label, data_accounts)
+        accounts_lower = [account.lower() for account in accounts]
+        term_hits: Dict[int, np.ndarray] = {}
+
+        suggestions = {}
+        for start in range(0, len(labels), SUGGEST_LABEL_CHUNK):
+            stop = start + SUGGEST_LABEL_CHUNK
+            matches = (label_matrix[start:stop] @ account_matrix) > 0
+            matches |= label_ids[start:stop, None] == account_ids[None, :]
+
+            for row, label in enumerate(labels[start:stop], start):
+                chosen = list(np.flatnonzero(matches[row - start])[:limit])
+                if len(chosen) < limit:
+                    self._add_term_suggestions(
+                        label_names[row].lower(), accounts_lower, term_hits, chosen, limit
+                    )
+                suggestions[label] = [accounts[position] for position in chosen]
 
         return suggestions
+
+    def _add_term_suggestions(
+        self,
+        normalized_label: str,
+        accounts_lower: List[str],
+        term_hits: Dict[int, np.ndarray],
+        chosen: List[int],
+        limit: int,
+    ):
+        """Fill chosen up to limit with accounts containing XBRL terms found
+        in the label, by term order then account order."""
+        for rank in self.xbrl_index.all_inside(normalized_label):
+            hits = term_hits.get(rank)
+            if hits is None:
+                term = self.xbrl_index.terms[rank]
+                hits = term_hits[rank] = np.flatnonzero(
+                    [term in account for account in accounts_lower]
+                )
+            for position in hits:
+                if position not in chosen:
+                    chosen.append(position)
+                    if len(chosen) == limit:
+                        return
+
+
+_default_knowledge_base: Optional[KnowledgeExtractor] = None
+_default_knowledge_base_lock = threading.Lock()
+
+
+def default_knowledge_base() -> KnowledgeExtractor:
+    """Process-wide knowledge base shared by processors, validators and workers.
+
+    Components load lazily on first use; call reload() on it to pick up
+    changed knowledge files.
+    """
+    global _default_knowledge_base
+    with _default_knowledge_base_lock:
+        if _default_knowledge_base is None:
+            _default_knowledge_base = KnowledgeExtractor()
+        return _default_knowledge_base
@@ -0,0 +1,255 @@
+"""
+Precompiled snapshot of the Finance Knowledge workbooks.
+
+Parsing the three knowledge workbooks with pandas and regexes takes
+seconds; KnowledgeExtractor is built on every step 3 run. The parsed
+components (XBRL terms, formulas, benchmarks, synonym map and graph, and
+the substring indexes over terms and synonyms) are written once to a single
+binary file, one pickle per component, next to a JSON manifest with
+their offsets and the size, mtime and SHA-256 of every source workbook.
+Loading memory-maps the file and unpickles only the components asked for.
+
+A snapshot is used only while its version matches SNAPSHOT_VERSION and
+every source file is unchanged: same size and mtime, or, if the mtime
+moved, the same content hash. Build or refresh it with:
+
+    python -m src.core.knowledge_snapshot [--source "Finance Knowledge"] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from config.settings import KNOWLEDGE_SNAPSHOT_PATH
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Bump when parsing rules or component layout change
+SNAPSHOT_VERSION = "5"
+
+SOURCE_FILES = (
+    "xbrl-terminology.xlsx",
+    "formulas_with_explanations_with_questions_with_gt.xlsx",
+    "financebench.xlsx",
+)
+
+COMPONENTS = (
+    "xbrl_terms",
+    "financial_formulas",
+    "benchmarks",
+    "account_synonyms",
+    "term_index",
+    "xbrl_index",
+    "synonym_graph",
+)
+
+
+def manifest_path_for(snapshot_path: Path) -> Path:
+    return snapshot_path.with_name(snapshot_path.name + ".manifest.json")
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_entry(path: Path) -> Dict:
+    stat = path.stat()
+    return {
+        "name": path.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": _file_digest(path),
+    }
+
+
+def _sources_unchanged(knowledge_path: Path, recorded: Sequence[Dict]) -> bool:
+    """True if every recorded source still has the same size and mtime or hash."""
+    if sorted(entry["name"] for entry in recorded) != sorted(SOURCE_FILES):
+        return False
+
+    for entry in recorded:
+        path = knowledge_path / entry["name"]
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        # A touched but identical file (e.g. a fresh checkout) is still valid
+        if stat.st_mtime_ns != entry["mtime_ns"] and _file_digest(path) != entry["sha256"]:
+            return False
+    return True
+
+
+def _atomic_write(path: Path, data: bytes):
+    # Write to a temp file first so readers never see a partial file
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class KnowledgeSnapshot:
+    """A validated snapshot file; components are unpickled on demand."""
+
+    def __init__(self, path: Path, manifest: Dict):
+        self.path = path
+        self.manifest = manifest
+        with open(path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self) -> "KnowledgeSnapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, component: str) -> bool:
+        return component in self.manifest["components"]
+
+    def load(self, component: str):
+        """Unpickle one component straight from the mapped file."""
+        offset, length = self.manifest["components"][component]
+        with memoryview(self._mmap) as view, view[offset : offset + length] as blob:
+            return pickle.loads(blob)
+
+    def close(self):
+        self._mmap.close()
+
+
+def open_snapshot(
+    knowledge_path: Path, snapshot_path: Optional[Path] = None
+) -> Optional[KnowledgeSnapshot]:
+    """The snapshot for knowledge_path, or None if missing or out of date."""
+    snapshot_path = Path(snapshot_path or KNOWLEDGE_SNAPSHOT_PATH)
+    try:
+        manifest = json.loads(manifest_path_for(snapshot_path).read_text())
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        logger.info("Knowledge snapshot is from another version, ignoring it")
+        return None
+    if not _sources_unchanged(Path(knowledge_path), manifest.get("sources", ())):
+        logger.info("Knowledge base files changed since the snapshot was built")
+        return None
+
+    try:
+        snapshot = KnowledgeSnapshot(snapshot_path, manifest)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable knowledge snapshot: {e}")
+        return None
+    if snapshot._mmap.size() != manifest.get("size"):
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def write_snapshot(
+    knowledge_path: Path,
+    components: Dict[str, object],
+    snapshot_path: Optional[Path] = None,
+) -> Path:
+    """Write components and a manifest fingerprinting the source workbooks."""
+    snapshot_path = Path(snapshot_path or KNOWLEDGE_SNAPSHOT_PATH)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    blobs = []
+    offsets = {}
+    position = 0
+    for name, value in components.items():
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        offsets[name] = [position, len(blob)]
+        blobs.append(blob)
+        position += len(blob)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "size": position,
+        "sources": [
+            _source_entry(Path(knowledge_path) / name) for name in SOURCE_FILES
+        ],
+        "components": offsets,
+        "counts": {
+            name: len(value)
+            for name, value in components.items()
+            if hasattr(value, "__len__")
+        },
+    }
+
+    # Data first: a reader holding the old manifest fails the size check
+    _atomic_write(snapshot_path, b"".join(blobs))
+    _atomic_write(
+        manifest_path_for(snapshot_path), json.dumps(manifest, indent=2).encode("utf-8")
+    )
+    logger.info(f"Wrote knowledge snapshot {snapshot_path} ({position:,} bytes)")
+    return snapshot_path
+
+
+def build_snapshot(
+    knowledge_path: Path, snapshot_path: Optional[Path] = None
+) -> Path:
+    """Parse the source workbooks and write a fresh snapshot."""
+    from .knowledge_extractor import KnowledgeExtractor
+
+    extractor = KnowledgeExtractor(str(knowledge_path), use_snapshot=False)
+    missing = [name for name in COMPONENTS if not getattr(extractor, name)]
+    if missing:
+        raise ValueError(f"Knowledge base incomplete, nothing loaded for {missing}")
+    return write_snapshot(
+        knowledge_path,
+        {name: getattr(extractor, name) for name in COMPONENTS},
+        snapshot_path,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile the Finance Knowledge workbooks into a snapshot"
+    )
+    parser.add_argument(
+        "--source", default="Finance Knowledge", help="Knowledge base directory"
+    )
+    parser.add_argument(
+        "--output", default=KNOWLEDGE_SNAPSHOT_PATH, help="Snapshot file to write"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Rebuild even if the snapshot is current"
+    )
+    args = parser.parse_args(argv)
+
+    knowledge_path, snapshot_path = Path(args.source), Path(args.output)
+    if not args.force:
+        snapshot = open_snapshot(knowledge_path, snapshot_path)
+        if snapshot is not None:
+            snapshot.close()
+            print(f"{snapshot_path} is up to date")
+            return 0
+
+    started = time.perf_counter()
+    build_snapshot(knowledge_path, snapshot_path)
+    manifest = json.loads(manifest_path_for(snapshot_path).read_text())
+    counts = ", ".join(f"{count} {name}" for name, count in manifest["counts"].items())
+    print(f"Built {snapshot_path} in {time.perf_counter() - started:.1f}s: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional, Tuple
+from utils.logger import Logger
+from .data_handler import DataHandler
+from .span_table import SpanTable
+
+logger = Logger(__name__)
+
+# (page, x, y, font_size, formatted value)
+OverlayEntry = Tuple[int, float, float, float, str]
+
+
+class OverlayPlan:
+    """Precompiled list of values to draw on the template.
+
+    Built once from the span table, the label->account mapping and the
+    account values. Entries are indexed by template label, so mapping or
+    data edits only recompile the labels they touch.
+    """
+
+    def __init__(
+        self,
+        span_table: SpanTable,
+        semantic_mapping: Dict[str, str],
+        data_accounts: Dict[str, float],
+    ):
+        self.span_table = span_table
+        self.semantic_mapping = dict(semantic_mapping)
+        self.data_accounts = dict(data_accounts)
+        self._label_rows = self._index_labels(span_table)
+        self._entries: Dict[str, List[Tuple[int, OverlayEntry]]] = {}
+        self._pages: Optional[Dict[int, List[OverlayEntry]]] = None
+
+        for label in self.semantic_mapping:
+            self._compile_label(label)
+
+        logger.debug(
+            f"Overlay plan compiled: {len(self)} values for {len(self._entries)} labels"
+        )
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    @staticmethod
+    def _index_labels(span_table: SpanTable) -> Dict[str, List[int]]:
+        """Map each span text to the rows where it appears."""
+        label_rows: Dict[str, List[int]] = {}
+        for row, text in enumerate(span_table.texts()):
+            label_rows.setdefault(text, []).append(row)
+        return label_rows
+
+    def _compile_label(self, label: str):
+        """(Re)build the entries for one template label."""
+        self._pages = None
+        self._entries.pop(label, None)
+
+        rows = self._label_rows.get(label)
+        account_name = self.semantic_mapping.get(label)
+        if not rows or account_name not in self.data_accounts:
+            return
+
+        formatted_value = DataHandler.format_number(self.data_accounts[account_name])
+        table = self.span_table
+        self._entries[label] = [
+            (
+                row,
+                (
+                    int(table.page[row]),
+                    float(table.x[row]),
+                    float(table.y[row]),
+                    float(table.font_size[row]),
+                    formatted_value,
+                ),
+            )
+            for row in rows
+        ]
+
+    def update_mapping(self, semantic_mapping: Dict[str, str]) -> int:
+        """Apply a new mapping, recompiling only changed labels."""
+        changed = [
+            label
+            for label in self.semantic_mapping.keys() | semantic_mapping.keys()
+            if self.semantic_mapping.get(label) != semantic_mapping.get(label)
+        ]
+        self.semantic_mapping = dict(semantic_mapping)
+        for label in changed:
+            self._compile_label(label)
+        return len(changed)
+
+    def update_data(self, data_accounts: Dict[str, float]) -> int:
+        """Apply new account values, recompiling only labels that use them."""
+        changed_accounts = {
+            account
+            for account in self.data_accounts.keys() | data_accounts.keys()
+            if self.data_accounts.get(account) != data_accounts.get(account)
+        }
+        self.data_accounts = dict(data_accounts)
+        changed = [
+            label
+            for label, account in self.semantic_mapping.items()
+            if account in changed_accounts
+        ]
+        for label in changed:
+            self._compile_label(label)
+        return len(changed)
+
+    def pages(self) -> Dict[int, List[OverlayEntry]]:
+        """Return entries grouped by page, in template span order."""
+        if self._pages is None:
+            rows = sorted(
+                row_entry
+                for entries in self._entries.values()
+                for row_entry in entries
+            )
+            pages: Dict[int, List[OverlayEntry]] = {}
+            for _, entry in rows:
+                pages.setdefault(entry[0], []).append(entry)
+            self._pages = pages
+        return self._pages
+
+    def entries(self) -> List[OverlayEntry]:
+        """Return all entries as a flat list in template span order."""
+        pages = self.pages()
+        return [entry for page_num in sorted(pages) for entry in pages[page_num]]
@@ -1,76 +1,190 @@
 import io
+import os
+import tempfile
+import time
 import fitz
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from utils.logger import Logger
-from .data_handler import DataHandler
+from .overlay_plan import OverlayPlan
+from .span_table import SpanTable
 
 logger = Logger(__name__)
 
+# Drop unreferenced objects and compress new content streams on full saves
+SAVE_OPTIONS = {"garbage": 1, "deflate": True}
+OVERLAY_COLOR = (0, 0, 0)
+
 
 class PDFHandler:
     def __init__(self, template_bytes: bytes):
         """Initialize with template PDF."""
+        self.template_bytes = template_bytes
         self.template_pdf = fitz.open(stream=template_bytes, filetype="pdf")
         self.total_pages = len(self.template_pdf)
+        self._template_modified = False
+        # One font object per handler; PyMuPDF embeds it once per document
+        self.overlay_font = fitz.Font("helv")
+        self.last_stats: Dict[str, float] = {}
         logger.info(f"PDF Handler initialized with {self.total_pages} pages")
 
     def generate_output_pdf(
         self,
-        coordinate_map: Dict,
+        coordinate_map: Union[SpanTable, Dict],
         semantic_mapping: Dict[str, str],
         data_accounts: Dict[str, float],
         progress_callback=None,
-    ) -> bytes:
-        """Generate final PDF with overlaid financial data."""
+        plan: Optional[OverlayPlan] = None,
+        output: Optional[Union[str, os.PathLike, BinaryIO]] = None,
+    ) -> Optional[bytes]:
+        """Generate final PDF with overlaid financial data.
+
+        coordinate_map is the SpanTable from TemplateAnalyzer; a legacy
+        {page: [span dict, ...]} map is converted on the fly. Pass a
+        prebuilt plan to reuse it across regenerations (the other inputs
+        are then ignored).
+
+        Without output the PDF is returned as bytes. With a file path the
+        template bytes are copied there and only the overlays are appended
+        as an incremental update; with a writable file object the document
+        is saved straight into it. Both return None.
+        """
         try:
-            # Create a copy of the template for modification
-            output_document = fitz.open(
-                stream=self.template_pdf.tobytes(), filetype="pdf"
-            )
-
-            for page_num in range(self.total_pages):
-                if progress_callback:
-                    progress_callback(page_num + 1, self.total_pages)
-
-                page = output_document[page_num]
-                page_elements = coordinate_map.get(page_num, [])
-
-                for element in page_elements:
-                    text = element.get("text", "").strip()
-
-                    if text in semantic_mapping:
-                        account_name = semantic_mapping[text]
-
-                        if account_name in data_accounts:
-                            value = data_accounts[account_name]
-                            formatted_value = DataHandler.format_number(value)
-
-                            self._overlay_text(
-                                page,
-                                element["x"],
-                                element["y"],
-                                formatted_value,
-                                element.get("font_size", 12),
-                            )
-
-            # Convert document to bytes
-            output_bytes = output_document.tobytes()
-            output_document.close()
-
-            logger.info("PDF generation completed")
+            if plan is None:
+                plan = self.build_overlay_plan(
+                    coordinate_map, semantic_mapping, data_accounts
+                )
+            page_overlays = plan.pages()
+
+            self.last_stats = {"values": 0, "pages_written": 0}
+            started = time.perf_counter()
+
+            if isinstance(output, (str, os.PathLike)):
+                self._write_incremental(Path(output), page_overlays, progress_callback)
+                self._log_stats(started, os.path.getsize(output))
+                return None
+
+            output_document, owned = self._working_document()
+            try:
+                self._apply_overlays(output_document, page_overlays, progress_callback)
+
+                if output is None:
+                    output_bytes = output_document.tobytes(**SAVE_OPTIONS)
+                    output_size = len(output_bytes)
+                else:
+                    seekable = output.seekable()
+                    start_position = output.tell() if seekable else 0
+                    output_document.save(output, **SAVE_OPTIONS)
+                    output_size = output.tell() - start_position if seekable else 0
+                    output_bytes = None
+            finally:
+                if owned:
+                    output_document.close()
+
+            self._log_stats(started, output_size)
             return output_bytes
 
         except Exception as e:
             logger.error(f"PDF generation failed: {str(e)}")
             raise
 
-    def _overlay_text(self, page, x: float, y: float, text: str, font_size: float):
-        """Overlay text on PDF page at specified coordinates."""
+    def _working_document(self) -> Tuple[fitz.Document, bool]:
+        """Return a document to draw on and whether the caller must close it.
+
+        The first generation draws on the already-open template; later ones
+        reopen the original bytes instead of re-serializing the template.
+        """
+        if not self._template_modified:
+            self._template_modified = True
+            return self.template_pdf, False
+        return fitz.open(stream=self.template_bytes, filetype="pdf"), True
+
+    def _apply_overlays(
+        self,
+        document: fitz.Document,
+        page_overlays: Dict[int, List[Tuple]],
+        progress_callback=None,
+    ):
+        """Draw the planned values, writing each page's text in one batch."""
+        overlay_started = time.perf_counter()
+
+        for page_num in range(self.total_pages):
+            if progress_callback:
+                progress_callback(page_num + 1, self.total_pages)
+
+            entries = page_overlays.get(page_num)
+            if not entries:
+                continue
+
+            page = document[page_num]
+            writer = fitz.TextWriter(page.rect)
+            for _, x, y, font_size, formatted_value in entries:
+                self._overlay_text(writer, x, y, formatted_value, font_size)
+
+            self.last_stats["values"] += len(entries)
+            self.last_stats["pages_written"] += 1
+            writer.write_text(page, color=OVERLAY_COLOR, overlay=True)
+
+        self.last_stats["overlay_seconds"] = time.perf_counter() - overlay_started
+
+    def _log_stats(self, started: float, output_size: int):
+        """Record and log timing and size of the last generation."""
+        self.last_stats["total_seconds"] = time.perf_counter() - started
+        self.last_stats["output_bytes"] = output_size
+        self.last_stats["template_bytes"] = len(self.template_bytes)
+        logger.info(
+            f"PDF generation completed: {self.last_stats['values']} values on "
+            f"{self.last_stats['pages_written']} pages, overlay "
+            f"{self.last_stats['overlay_seconds'] * 1000:.0f} ms, total "
+            f"{self.last_stats['total_seconds'] * 1000:.0f} ms, output "
+            f"{output_size / 1024:.1f} KB (template {len(self.template_bytes) / 1024:.1f} KB)"
+        )
+
+    def _write_incremental(
+        self, path: Path, page_overlays: Dict[int, List[Tuple]], progress_callback=None
+    ):
+        """Copy the template to path and append the overlays incrementally."""
+        path.write_bytes(self.template_bytes)
+        document = fitz.open(path)
+        try:
+            self._apply_overlays(document, page_overlays, progress_callback)
+
+            if document.can_save_incrementally():
+                document.save(
+                    path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP
+                )
+                return
+
+            # Repaired or otherwise non-incremental files need a full rewrite
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".pdf")
+            os.close(fd)
+            try:
+                document.save(tmp_name, **SAVE_OPTIONS)
+            except Exception:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+        finally:
+            document.close()
+        os.replace(tmp_name, path)
+
+    @staticmethod
+    def build_overlay_plan(
+        coordinate_map: Union[SpanTable, Dict],
+        semantic_mapping: Dict[str, str],
+        data_accounts: Dict[str, float],
+    ) -> OverlayPlan:
+        """Compile the values to draw from the template spans and mapping."""
+        if not isinstance(coordinate_map, SpanTable):
+            coordinate_map = SpanTable.from_coordinate_map(coordinate_map)
+        return OverlayPlan(coordinate_map, semantic_mapping, data_accounts)
+
+    def _overlay_text(
+        self, writer: fitz.TextWriter, x: float, y: float, text: str, font_size: float
+    ):
+        """Queue text at the specified coordinates on the page's writer."""
         try:
             point = fitz.Point(x, y)
-            page.insert_text(
-                point, text, fontsize=font_size, color=(0, 0, 0), overlay=True
-            )
+            writer.append(point, text, font=self.overlay_font, fontsize=font_size)
         except Exception as e:
             logger.error(f"Failed to overlay text at ({x}, {y}): {str(e)}")
 
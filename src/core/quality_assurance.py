@@ -3,7 +3,7 @@ import time
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import dataclass
 from utils.logger import Logger
-from .knowledge_extractor import KnowledgeExtractor
+from .knowledge_extractor import default_knowledge_base
 from .enhanced_ai_processor import EnhancedAIProcessor
 from .financial_validator import FinancialValidator, ValidationResult
 
@@ -43,7 +43,7 @@ class QualityAssurance:
     """Comprehensive quality assurance and accuracy measurement system."""
     
     def __init__(self):
-        self.knowledge_base = KnowledgeExtractor()
+        self.knowledge_base = default_knowledge_base()
         self.test_cases = self._load_test_cases()
         self.accuracy_history = []
         self.quality_standards = self._initialize_quality_standards()
@@ -0,0 +1,254 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+
+
+class SpanTable:
+    """Columnar store of template text spans.
+
+    Rows are ordered by page. Coordinates are float32, font names are
+    interned into ``fonts`` and span texts live in one string buffer that
+    is sliced with ``text_offsets`` (row i is text[offsets[i]:offsets[i+1]]).
+    """
+
+    def __init__(
+        self,
+        page: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        font_size: np.ndarray,
+        flags: np.ndarray,
+        font_id: np.ndarray,
+        fonts: List[str],
+        text: str,
+        text_offsets: np.ndarray,
+        page_count: int,
+    ):
+        self.page = page
+        self.x = x
+        self.y = y
+        self.font_size = font_size
+        self.flags = flags
+        self.font_id = font_id
+        self.fonts = fonts
+        self.text = text
+        self.text_offsets = text_offsets
+        self.page_count = page_count
+        # page_bounds[p]:page_bounds[p + 1] is the row range of page p
+        self.page_bounds = np.searchsorted(
+            page, np.arange(page_count + 1), side="left"
+        )
+
+    def __len__(self) -> int:
+        return len(self.page)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the table."""
+        arrays = (
+            self.page,
+            self.x,
+            self.y,
+            self.font_size,
+            self.flags,
+            self.font_id,
+            self.text_offsets,
+        )
+        return sum(a.nbytes for a in arrays) + len(self.text.encode("utf-8"))
+
+    def text_at(self, row: int) -> str:
+        """Return the text of a single row."""
+        return self.text[self.text_offsets[row] : self.text_offsets[row + 1]]
+
+    def texts(self) -> List[str]:
+        """Return all span texts in row order."""
+        offsets = self.text_offsets.tolist()
+        text = self.text
+        return [text[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def labels(self) -> List[str]:
+        """Return the template labels (span texts) in page order."""
+        return self.texts()
+
+    def page_rows(self, page_num: int) -> range:
+        """Return the row range belonging to a page."""
+        if page_num < 0 or page_num >= self.page_count:
+            return range(0)
+        return range(int(self.page_bounds[page_num]), int(self.page_bounds[page_num + 1]))
+
+    def iter_page(self, page_num: int) -> Iterator[Tuple[str, float, float, float]]:
+        """Yield (text, x, y, font_size) for every span on a page."""
+        rows = self.page_rows(page_num)
+        if not rows:
+            return
+        start, stop = rows.start, rows.stop
+        offsets = self.text_offsets[start : stop + 1].tolist()
+        xs = self.x[start:stop].tolist()
+        ys = self.y[start:stop].tolist()
+        sizes = self.font_size[start:stop].tolist()
+        text = self.text
+        for i in range(stop - start):
+            yield text[offsets[i] : offsets[i + 1]], xs[i], ys[i], sizes[i]
+
+    def to_coordinate_map(self) -> Dict[int, List[Dict]]:
+        """Expand into the legacy {page: [span dict, ...]} coordinate map."""
+        coordinate_map = {page_num: [] for page_num in range(self.page_count)}
+        texts = self.texts()
+        rows = zip(
+            self.page.tolist(),
+            texts,
+            self.x.tolist(),
+            self.y.tolist(),
+            self.font_size.tolist(),
+            self.font_id.tolist(),
+            self.flags.tolist(),
+        )
+        for page_num, text, x, y, font_size, font_id, flags in rows:
+            coordinate_map[page_num].append(
+                {
+                    "text": text,
+                    "x": x,
+                    "y": y,
+                    "font_size": font_size,
+                    "font_name": self.fonts[font_id],
+                    "flags": flags,
+                }
+            )
+        return coordinate_map
+
+    @classmethod
+    def from_coordinate_map(cls, coordinate_map: Dict[int, List[Dict]]) -> "SpanTable":
+        """Build a table from a legacy coordinate map."""
+        builder = SpanTableBuilder()
+        for page_num in sorted(coordinate_map):
+            for element in coordinate_map[page_num]:
+                builder.append(
+                    page_num,
+                    element.get("text", "").strip(),
+                    element["x"],
+                    element["y"],
+                    element.get("font_size", 12),
+                    element.get("font_name", "unknown"),
+                    element.get("flags", 0),
+                )
+        page_count = max(coordinate_map) + 1 if coordinate_map else 0
+        return builder.build(page_count)
+
+    @classmethod
+    def concat(cls, tables: Iterable["SpanTable"], page_count: int) -> "SpanTable":
+        """Concatenate tables covering disjoint, increasing page ranges."""
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return SpanTableBuilder().build(page_count)
+
+        fonts: Dict[str, int] = {}
+        font_ids = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        text_base = 0
+        for table in tables:
+            remap = np.array(
+                [fonts.setdefault(name, len(fonts)) for name in table.fonts],
+                dtype=np.int32,
+            )
+            font_ids.append(remap[table.font_id])
+            offsets.append(table.text_offsets[1:] + text_base)
+            text_base += len(table.text)
+
+        return cls(
+            page=np.concatenate([t.page for t in tables]),
+            x=np.concatenate([t.x for t in tables]),
+            y=np.concatenate([t.y for t in tables]),
+            font_size=np.concatenate([t.font_size for t in tables]),
+            flags=np.concatenate([t.flags for t in tables]),
+            font_id=np.concatenate(font_ids),
+            fonts=list(fonts),
+            text="".join(t.text for t in tables),
+            text_offsets=np.concatenate(offsets),
+            page_count=page_count,
+        )
+
+    def save(self, file):
+        """Write the table to an .npz file path or binary file object."""
+        np.savez(
+            file,
+            page=self.page,
+            x=self.x,
+            y=self.y,
+            font_size=self.font_size,
+            flags=self.flags,
+            font_id=self.font_id,
+            fonts=np.array(self.fonts, dtype=str),
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            text_offsets=self.text_offsets,
+            page_count=np.int32(self.page_count),
+        )
+
+    @classmethod
+    def load(cls, file) -> "SpanTable":
+        """Read a table written by save()."""
+        with np.load(file, allow_pickle=False) as archive:
+            return cls(
+                page=archive["page"],
+                x=archive["x"],
+                y=archive["y"],
+                font_size=archive["font_size"],
+                flags=archive["flags"],
+                font_id=archive["font_id"],
+                fonts=archive["fonts"].tolist(),
+                text=archive["text"].tobytes().decode("utf-8"),
+                text_offsets=archive["text_offsets"],
+                page_count=int(archive["page_count"]),
+            )
+
+
+class SpanTableBuilder:
+    """Accumulates spans into typed buffers without per-span dicts."""
+
+    def __init__(self):
+        self._page = array("i")
+        self._x = array("f")
+        self._y = array("f")
+        self._font_size = array("f")
+        self._flags = array("i")
+        self._font_id = array("i")
+        self._fonts: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._page)
+
+    def append(
+        self,
+        page_num: int,
+        text: str,
+        x: float,
+        y: float,
+        font_size: float,
+        font_name: str,
+        flags: int,
+    ):
+        """Add one span. Pages must be appended in non-decreasing order."""
+        self._page.append(page_num)
+        self._x.append(x)
+        self._y.append(y)
+        self._font_size.append(font_size)
+        self._flags.append(flags)
+        self._font_id.append(self._fonts.setdefault(font_name, len(self._fonts)))
+        self._texts.append(text)
+        self._offsets.append(self._offsets[-1] + len(text))
+
+    def build(self, page_count: int) -> SpanTable:
+        """Freeze the buffers into a SpanTable."""
+        return SpanTable(
+            page=np.frombuffer(self._page, dtype=np.int32).copy(),
+            x=np.frombuffer(self._x, dtype=np.float32).copy(),
+            y=np.frombuffer(self._y, dtype=np.float32).copy(),
+            font_size=np.frombuffer(self._font_size, dtype=np.float32).copy(),
+            flags=np.frombuffer(self._flags, dtype=np.int32).copy(),
+            font_id=np.frombuffer(self._font_id, dtype=np.int32).copy(),
+            fonts=list(self._fonts),
+            text="".join(self._texts),
+            text_offsets=np.frombuffer(self._offsets, dtype=np.int64).copy(),
+            page_count=page_count,
+        )
@@ -0,0 +1,97 @@
+"""
+Bidirectional synonym graph over the knowledge base's terms.
+
+KnowledgeExtractor.get_synonyms used to scan every XBRL term's synonym
+list per call. SynonymGraph is built once from (canonical term, variant)
+pairs and keeps, for every term:
+
+- its variants (when it is a canonical term) and the canonical terms
+  listing it (when it is a variant);
+- its closure group: every term reachable through trusted links.
+
+Only trusted links (curated variations, or two real XBRL terms) are
+followed transitively. Loose links, pulled from free explanation text,
+are full of words like "and", "that" or "item"; they are still listed as
+direct synonyms but never chain unrelated terms together.
+
+Synonym lists are precomputed, so synonyms() and expand() are dict lookups.
+"""
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class SynonymGraph:
+    """Canonical terms, their variants and transitive synonym groups."""
+
+    def __init__(
+        self,
+        links: Iterable[Tuple[str, str]],
+        loose_links: Iterable[Tuple[str, str]] = (),
+    ):
+        variants: Dict[str, List[str]] = {}
+        canonicals: Dict[str, List[str]] = {}
+        trusted: List[Tuple[str, str]] = []
+        for pairs, is_trusted in ((links, True), (loose_links, False)):
+            for canonical, variant in pairs:
+                if not canonical or not variant or canonical == variant:
+                    continue
+                if is_trusted:
+                    trusted.append((canonical, variant))
+                if variant not in variants.setdefault(canonical, []):
+                    variants[canonical].append(variant)
+                    canonicals.setdefault(variant, []).append(canonical)
+
+        self._variants = {term: tuple(found) for term, found in variants.items()}
+        self._canonicals = {term: tuple(found) for term, found in canonicals.items()}
+
+        # Union-find over the trusted links only
+        parent: Dict[str, str] = {}
+
+        def root(term: str) -> str:
+            parent.setdefault(term, term)
+            while parent[term] != term:
+                parent[term] = parent[parent[term]]
+                term = parent[term]
+            return term
+
+        for canonical, variant in trusted:
+            parent[root(variant)] = root(canonical)
+
+        groups: Dict[str, Set[str]] = {}
+        for term in list(parent):
+            groups.setdefault(root(term), set()).add(term)
+
+        # Synonyms per term: its group, plus its direct links and, through
+        # each canonical term listing it, that term's other variants
+        self._synonyms: Dict[str, Tuple[str, ...]] = {}
+        for term in self._variants.keys() | self._canonicals.keys():
+            related = set(groups.get(root(term), ()))
+            related.update(self._variants.get(term, ()))
+            for canonical in self._canonicals.get(term, ()):
+                related.add(canonical)
+                related.update(self._variants[canonical])
+            related.discard(term)
+            if related:
+                self._synonyms[term] = tuple(sorted(related))
+
+    def __len__(self) -> int:
+        return len(self._synonyms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._synonyms
+
+    def variants(self, term: str) -> Tuple[str, ...]:
+        """Variants listed under a canonical term."""
+        return self._variants.get(term, ())
+
+    def canonicals(self, term: str) -> Tuple[str, ...]:
+        """Canonical terms that list term as a variant."""
+        return self._canonicals.get(term, ())
+
+    def synonyms(self, term: str) -> Tuple[str, ...]:
+        """Every synonym of term (sorted, without the term itself)."""
+        return self._synonyms.get(term, ())
+
+    def expand(self, term: str) -> Tuple[str, ...]:
+        """The term followed by its synonyms, e.g. for prompts or matching."""
+        return (term,) + self._synonyms.get(term, ())
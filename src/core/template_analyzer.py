@@ -1,76 +1,189 @@
 import io
 import base64
 import json
-from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import fitz
 from utils.logger import Logger
-from config.settings import VISION_MODEL, OPENROUTER_BASE_URL, OPENROUTER_API_KEY, API_TIMEOUT_SECONDS
-import requests
+from config.settings import (
+    VISION_MODEL,
+    OPENROUTER_BASE_URL,
+    OPENROUTER_API_KEY,
+    API_TIMEOUT_SECONDS,
+    TEMPLATE_ANALYSIS_WORKERS,
+)
+from .span_table import SpanTable, SpanTableBuilder
+from .template_cache import TemplateCache
 
 logger = Logger(__name__)
 
+# Bump whenever span extraction changes so cached coordinate maps are rebuilt
+ANALYZER_VERSION = "2"
+
+# Text-only extraction: image blocks are never used, so skip decoding them
+TEXT_EXTRACTION_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Document opened once per worker process by _init_worker
+_worker_document = None
+
+
+def _init_worker(pdf_bytes: bytes):
+    """Open the template once for the lifetime of a worker process."""
+    global _worker_document
+    _worker_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _analyze_page_range(start: int, end: int) -> SpanTable:
+    """Extract spans for pages [start, end) from the worker's document."""
+    builder = SpanTableBuilder()
+    for page_num in range(start, end):
+        _extract_spans(_worker_document[page_num], page_num, builder)
+    return builder.build(end)
+
+
+def _extract_spans(page, page_num: int, builder: SpanTableBuilder) -> int:
+    """Append text and coordinates from a single page to the builder."""
+    try:
+        span_count = 0
+
+        text_dict = page.get_text("dict", flags=TEXT_EXTRACTION_FLAGS)
+
+        for block in text_dict.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        text = span["text"].strip()
+                        if text:
+                            rect = span["bbox"]
+                            builder.append(
+                                page_num,
+                                text,
+                                rect[0],
+                                rect[1],
+                                span.get("size", 12),
+                                span.get("font", "unknown"),
+                                span.get("flags", 0),
+                            )
+                            span_count += 1
+
+        logger.debug(f"Page {page_num}: extracted {span_count} text elements")
+        return span_count
+
+    except Exception as e:
+        logger.error(f"Failed to extract page {page_num} data: {str(e)}")
+        return 0
+
+
+def _split_page_ranges(total_pages: int, workers: int) -> List[Tuple[int, int]]:
+    """Split pages into contiguous, roughly equal ranges (two per worker)."""
+    chunk_count = min(total_pages, workers * 2)
+    chunk_size, remainder = divmod(total_pages, chunk_count)
+    ranges = []
+    start = 0
+    for i in range(chunk_count):
+        end = start + chunk_size + (1 if i < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
 class TemplateAnalyzer:
-    def __init__(self):
+    def __init__(self, cache: Optional[TemplateCache] = None):
         self.api_key = OPENROUTER_API_KEY
         self.base_url = OPENROUTER_BASE_URL
         self.vision_model = VISION_MODEL
-        self.coordinate_map = {}
+        self.cache = cache
+        self.span_table: Optional[SpanTable] = None
     
-    def analyze_template(self, pdf_bytes: bytes, progress_callback=None) -> Dict:
-        """Extract labels and coordinates from template PDF."""
+    def analyze_template(
+        self, pdf_bytes: bytes, progress_callback=None, workers: Optional[int] = None
+    ) -> SpanTable:
+        """Extract labels and coordinates from template PDF.
+
+        Returns a SpanTable (one row per text span, ordered by page).
+        With workers > 1 (default: TEMPLATE_ANALYSIS_WORKERS), page ranges are
+        analyzed in a process pool and merged into the same table.
+        If a cache is configured, a hit returns without opening the PDF.
+        """
         try:
+            cache_key = self.cache.key_for(pdf_bytes) if self.cache else None
+            if cache_key:
+                cached_table = self.cache.load(cache_key)
+                if cached_table is not None:
+                    total_pages = cached_table.page_count
+                    if progress_callback:
+                        for page_num in range(total_pages):
+                            progress_callback(page_num + 1, total_pages)
+                    self.span_table = cached_table
+                    return self.span_table
+
             pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
             total_pages = len(pdf_document)
+            workers = TEMPLATE_ANALYSIS_WORKERS if workers is None else workers
             
             logger.info(f"Analyzing template: {total_pages} pages")
             
-            for page_num in range(total_pages):
-                if progress_callback:
-                    progress_callback(page_num + 1, total_pages)
+            if workers > 1 and total_pages > 1:
+                pdf_document.close()
+                self.span_table = self._analyze_parallel(
+                    pdf_bytes, total_pages, workers, progress_callback
+                )
+            else:
+                builder = SpanTableBuilder()
+                for page_num in range(total_pages):
+                    if progress_callback:
+                        progress_callback(page_num + 1, total_pages)
+                    
+                    page = pdf_document[page_num]
+                    _extract_spans(page, page_num, builder)
                 
-                page = pdf_document[page_num]
-                page_data = self._extract_page_data(page, page_num)
-                self.coordinate_map[page_num] = page_data
-            
-            pdf_document.close()
-            logger.info("Template analysis completed")
-            return self.coordinate_map
+                pdf_document.close()
+                self.span_table = builder.build(total_pages)
+
+            if cache_key:
+                self.cache.store(cache_key, self.span_table)
+
+            logger.info(
+                f"Template analysis completed: {len(self.span_table)} spans, "
+                f"{self.span_table.nbytes / 1024:.1f} KB"
+            )
+            return self.span_table
         
         except Exception as e:
             logger.error(f"Template analysis failed: {str(e)}")
             raise
-    
-    def _extract_page_data(self, page, page_num: int) -> List[Dict]:
-        """Extract text and coordinates from a single page."""
-        try:
-            page_data = []
-            
-            text_dict = page.get_text("dict")
-            
-            for block in text_dict.get("blocks", []):
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text = span["text"].strip()
-                            if text:
-                                rect = span["bbox"]
-                                x, y = rect[0], rect[1]
-                                
-                                page_data.append({
-                                    "text": text,
-                                    "x": x,
-                                    "y": y,
-                                    "font_size": span.get("size", 12),
-                                    "font_name": span.get("font", "unknown"),
-                                    "flags": span.get("flags", 0)
-                                })
-            
-            logger.debug(f"Page {page_num}: extracted {len(page_data)} text elements")
-            return page_data
-        
-        except Exception as e:
-            logger.error(f"Failed to extract page {page_num} data: {str(e)}")
-            return []
+
+    def _analyze_parallel(
+        self, pdf_bytes: bytes, total_pages: int, workers: int, progress_callback=None
+    ) -> SpanTable:
+        """Analyze page ranges in a process pool, reporting progress per page."""
+        page_ranges = _split_page_ranges(total_pages, workers)
+        range_tables = {}
+        pages_done = 0
+
+        logger.info(
+            f"Using {workers} workers for {len(page_ranges)} page ranges"
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(pdf_bytes,)
+        ) as executor:
+            futures = {
+                executor.submit(_analyze_page_range, start, end): (start, end)
+                for start, end in page_ranges
+            }
+            for future in as_completed(futures):
+                start, end = futures[future]
+                range_tables[start] = future.result()
+                for _ in range(start, end):
+                    pages_done += 1
+                    if progress_callback:
+                        progress_callback(pages_done, total_pages)
+
+        # Merge in page order so rows match the serial path
+        return SpanTable.concat(
+            (range_tables[start] for start in sorted(range_tables)), total_pages
+        )
     
     def _get_page_image(self, page) -> str:
         """Convert PDF page to base64 image for Vision API."""
@@ -83,5 +196,7 @@ class TemplateAnalyzer:
             raise
     
     def get_coordinate_map(self) -> Dict:
-        """Return the extracted coordinate map."""
-        return self.coordinate_map
+        """Return the extracted spans as a {page: [span dict, ...]} map."""
+        if self.span_table is None:
+            return {}
+        return self.span_table.to_coordinate_map()
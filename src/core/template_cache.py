@@ -0,0 +1,55 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+from utils.logger import Logger
+from .span_table import SpanTable
+
+logger = Logger(__name__)
+
+
+class TemplateCache:
+    """On-disk span-table cache keyed by template content and analyzer version."""
+
+    def __init__(self, cache_dir: str, analyzer_version: str):
+        self.cache_dir = Path(cache_dir)
+        self.analyzer_version = analyzer_version
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, pdf_bytes: bytes) -> str:
+        """Return the cache key for a template PDF."""
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        return f"{digest}-v{self.analyzer_version}"
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key: str) -> Optional[SpanTable]:
+        """Load a cached span table, or None on a miss."""
+        path = self._path_for(key)
+        if not path.exists():
+            return None
+
+        try:
+            span_table = SpanTable.load(path)
+            logger.info(f"Template cache hit: {key}")
+            return span_table
+
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable template cache entry {key}: {e}")
+            return None
+
+    def store(self, key: str, span_table: SpanTable):
+        """Store a span table under the given key."""
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                span_table.save(tmp_file)
+            os.replace(tmp_name, self._path_for(key))
+            logger.info(f"Stored template analysis in cache: {key}")
+
+        except Exception as e:
+            logger.warning(f"Failed to write template cache entry {key}: {e}")
+            Path(tmp_name).unlink(missing_ok=True)
@@ -0,0 +1,148 @@
+"""
+Substring lookups over the knowledge base's synonym terms.
+
+KnowledgeExtractor.normalize_account_name falls back to the first synonym
+term (in synonym-map order) that occurs inside the name or contains it,
+which used to mean a substring test against all ~6,500 terms per call.
+TermIndex answers the same question without the scan:
+
+- terms occurring inside the name come from an Aho-Corasick automaton,
+  one pass over the name (all_inside() lists every such term);
+- terms containing the name are looked up through character trigram
+  postings and then verified.
+
+Each term's position in the original order is its rank; the lowest rank
+among all hits wins, so results match the linear scan exactly.
+"""
+
+from typing import Dict, List, Optional, Sequence, Set
+
+# Rank of "no match" in the automaton's best-output table
+_NO_MATCH = 1 << 62
+
+# Longest gram indexed for containment lookups
+_GRAM = 3
+
+
+class TermIndex:
+    """First-ranked term that is a substring of, or contains, a query."""
+
+    def __init__(self, terms: Sequence[str]):
+        self.terms: List[str] = list(terms)
+
+        # Aho-Corasick automaton: goto edges, failure links and the lowest
+        # term rank ending at each state or any of its suffix states
+        self._goto: List[Dict[str, int]] = [{}]
+        self._best: List[int] = [_NO_MATCH]
+        # Lowest rank of a term ending exactly at each state, or -1
+        self._ends: List[int] = [-1]
+        for rank, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._best.append(_NO_MATCH)
+                    self._ends.append(-1)
+                state = next_state
+            self._best[state] = min(self._best[state], rank)
+            if self._ends[state] < 0:
+                self._ends[state] = rank
+        # Nearest suffix state where a term ends, for listing every match
+        self._output_link: List[int] = [-1] * len(self._goto)
+        self._fail = self._link_failures()
+
+        # Grams of up to _GRAM characters -> ranks of terms containing them,
+        # ascending
+        self._postings: Dict[str, List[int]] = {}
+        for rank, term in enumerate(self.terms):
+            for gram in self._grams(term, all_sizes=True):
+                postings = self._postings.setdefault(gram, [])
+                if not postings or postings[-1] != rank:
+                    postings.append(rank)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _link_failures(self) -> List[int]:
+        fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                self._best[next_state] = min(
+                    self._best[next_state], self._best[fail[next_state]]
+                )
+                self._output_link[next_state] = (
+                    fail[next_state]
+                    if self._ends[fail[next_state]] >= 0
+                    else self._output_link[fail[next_state]]
+                )
+                queue.append(next_state)
+        return fail
+
+    @staticmethod
+    def _grams(text: str, all_sizes: bool = False) -> Set[str]:
+        sizes = range(1, _GRAM + 1) if all_sizes else (min(_GRAM, len(text)),)
+        return {
+            text[i : i + size]
+            for size in sizes
+            for i in range(len(text) - size + 1)
+        }
+
+    def first_match(self, query: str) -> Optional[int]:
+        """Lowest rank of a term inside query or containing it, else None."""
+        if not self.terms:
+            return None
+        if not query:
+            return 0  # The empty string is inside every term
+
+        best = min(self._first_inside(query), self._first_containing(query))
+        return best if best != _NO_MATCH else None
+
+    def all_inside(self, query: str) -> List[int]:
+        """Ranks of every term occurring inside query, ascending."""
+        found = {self._ends[0]} if self._ends[0] >= 0 else set()
+        state = 0
+        for char in query:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            match = state if self._ends[state] >= 0 else self._output_link[state]
+            while match > 0:
+                found.add(self._ends[match])
+                match = self._output_link[match]
+        return sorted(found)
+
+    def _first_inside(self, query: str) -> int:
+        best = self._best[0]
+        state = 0
+        for char in query:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._best[state] < best:
+                best = self._best[state]
+        return best
+
+    def _first_containing(self, query: str) -> int:
+        rarest = None
+        for gram in self._grams(query):
+            ranks = self._postings.get(gram)
+            if not ranks:
+                return _NO_MATCH
+            if rarest is None or len(ranks) < len(rarest):
+                rarest = ranks
+
+        # Every term containing the query contains its rarest gram; walk
+        # those in rank order and the first real containment wins
+        for rank in rarest:
+            if query in self.terms[rank]:
+                return rank
+        return _NO_MATCH
@@ -11,6 +11,8 @@ import re
 import io
 import logging
 
+from utils.sheet_profile import HeaderRule, SheetProfile, default_profile_cache
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -260,6 +262,25 @@ class PDFExtractor:
 class ExcelExtractor:
     """Advanced Excel extraction handling multi-sheet, multi-column formats."""
 
+    # Header: first of the top rows with 2+ filled cells and a header keyword
+    # or a year label; blank headers read "Unnamed" like cleaned columns
+    HEADER_RULE = HeaderRule(
+        name="schedule",
+        header_keywords=(
+            "particular",
+            "account",
+            "description",
+            "note",
+            "year",
+            "amount",
+            "balance",
+        ),
+        description_keywords=("particular", "account", "description", "name", "item"),
+        min_filled_cells=2,
+        match_year_cells=True,
+        blank_label="Unnamed",
+    )
+
     def __init__(self):
         self.data = {}
 
@@ -280,6 +301,9 @@ class ExcelExtractor:
                 "total_sheets": len(all_sheets),
             }
 
+            profile_cache = default_profile_cache()
+            cache_key = profile_cache.key_for(excel_bytes)
+
             for sheet_name, df in all_sheets.items():
                 logger.info(f"Processing sheet: {sheet_name}")
 
@@ -287,8 +311,16 @@ class ExcelExtractor:
                 if len(df) < 3:
                     continue
 
+                # Header row, description and year columns (cached per workbook)
+                profile = profile_cache.get_or_detect(
+                    cache_key,
+                    self.HEADER_RULE,
+                    sheet_name,
+                    lambda: df.head(self.HEADER_RULE.head_rows).values.tolist(),
+                )
+
                 # Parse the sheet
-                parsed_data = self._parse_financial_sheet(df, sheet_name)
+                parsed_data = self._parse_financial_sheet(df, sheet_name, profile)
 
                 if parsed_data:
                     results["sheets"][sheet_name] = parsed_data
@@ -307,73 +339,37 @@ class ExcelExtractor:
         return results
 
     def _parse_financial_sheet(
-        self, df: pd.DataFrame, sheet_name: str
+        self, df: pd.DataFrame, sheet_name: str, profile: Optional[SheetProfile]
     ) -> Optional[Dict]:
-        """Parse a financial sheet with intelligent header detection."""
-
-        # Find header row
-        header_row_idx = self._find_header_row(df)
+        """Parse a financial sheet using its detected header profile."""
 
-        if header_row_idx is None:
+        if profile is None:
             logger.warning(f"No header found in sheet {sheet_name}")
             return None
 
         try:
             # Set header and clean data
-            new_df = df.iloc[header_row_idx:].copy()
-            new_df.columns = new_df.iloc[0]
-            new_df = new_df[1:].reset_index(drop=True)
-
-            # Clean column names
-            new_df.columns = [self._clean_column_name(col) for col in new_df.columns]
-
-            # Identify year columns
-            year_columns = self._identify_year_columns(new_df.columns)
-
-            # Identify description/account column
-            desc_column = self._identify_description_column(new_df.columns)
+            header_row_idx = profile.header_row
+            new_df = df.iloc[header_row_idx + 1 :].reset_index(drop=True)
+            columns = [
+                self._clean_column_name(col) for col in df.iloc[header_row_idx]
+            ]
+            new_df.columns = columns
 
             return {
                 "dataframe": new_df,
                 "header_row": header_row_idx,
-                "year_columns": year_columns,
-                "description_column": desc_column,
+                # Year columns, most recent first
+                "year_columns": [columns[pos] for pos in profile.year_columns],
+                "description_column": columns[profile.description_column],
                 "row_count": len(new_df),
+                "profile": profile,
             }
 
         except Exception as e:
             logger.warning(f"Failed to parse sheet {sheet_name}: {e}")
             return None
 
-    def _find_header_row(self, df: pd.DataFrame) -> Optional[int]:
-        """Find the row that contains column headers."""
-
-        for idx in range(min(10, len(df))):
-            row = df.iloc[idx]
-
-            # Check for header keywords
-            row_text = " ".join([str(val).lower() for val in row if pd.notna(val)])
-
-            header_keywords = [
-                "particular",
-                "account",
-                "description",
-                "note",
-                "year",
-                "2024",
-                "2025",
-                "amount",
-                "balance",
-            ]
-
-            if any(keyword in row_text for keyword in header_keywords):
-                # Check if multiple cells have content (typical for headers)
-                non_empty = sum(1 for val in row if pd.notna(val) and str(val).strip())
-                if non_empty >= 2:
-                    return idx
-
-        return None
-
     def _clean_column_name(self, col) -> str:
         """Clean column name."""
         if pd.isna(col):
@@ -387,50 +383,24 @@ class ExcelExtractor:
 
         return col_str
 
-    def _identify_year_columns(self, columns: List[str]) -> List[str]:
-        """Identify columns that contain year data (2024, 2025, etc.)."""
-        year_cols = []
-
-        for col in columns:
-            col_str = str(col)
-            # Check if column name is a year (4 digits between 2000-2100)
-            if re.match(r"^(20\d{2})$", col_str):
-                year_cols.append(col)
-
-        return sorted(year_cols, reverse=True)  # Most recent first
-
-    def _identify_description_column(self, columns: List[str]) -> Optional[str]:
-        """Identify the column containing account descriptions."""
-
-        desc_keywords = ["particular", "account", "description", "name", "item"]
-
-        for col in columns:
-            col_lower = str(col).lower()
-            if any(keyword in col_lower for keyword in desc_keywords):
-                return col
-
-        # Default to first column if no match
-        return columns[0] if len(columns) > 0 else None
-
     def _extract_financial_items(self, parsed_data: Dict) -> Dict[str, float]:
         """Extract financial line items with values."""
 
         df = parsed_data["dataframe"]
-        year_cols = parsed_data["year_columns"]
+        profile = parsed_data["profile"]
         desc_col = parsed_data["description_column"]
 
-        if not year_cols or not desc_col:
+        if profile.value_column is None or not desc_col:
             return {}
 
-        # Use most recent year
-        value_col = year_cols[0]
+        # Use most recent year; columns are read by position since cleaned
+        # names can repeat ("Unnamed")
+        accounts = df.iloc[:, profile.description_column]
+        values = df.iloc[:, profile.value_column]
 
         financial_items = {}
 
-        for idx, row in df.iterrows():
-            account = row.get(desc_col)
-            value = row.get(value_col)
-
+        for account, value in zip(accounts, values):
             # Skip if no account name
             if pd.isna(account) or not str(account).strip():
                 continue
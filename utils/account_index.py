@@ -0,0 +1,150 @@
+"""
+Token and trigram index over a workbook's account names.
+
+IntelligentMapper used to paste every account into every batch prompt.
+AccountIndex is built once per run and shortlists the accounts that are
+plausible for a batch of template labels, so only that union goes into
+the prompt. Scoring mixes IDF-weighted word overlap (with the financial
+equivalences the prompt itself teaches, e.g. revenue ~ sales) and
+character-trigram similarity, which catches plurals, abbreviations and
+typos. A label's scores are computed once and reused, so routing it by
+difficulty and shortlisting its accounts share the same pass.
+"""
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Set
+
+from utils.mapping_memory import normalize_name
+
+# Words treated as interchangeable when shortlisting; mirrors the
+# "SEMANTIC EQUIVALENCE" and "COMMON VARIATIONS" sections of the prompt
+EQUIVALENT_WORDS = (
+    ("revenue", "revenues", "sales", "turnover", "income", "fees"),
+    ("cogs", "cost", "costs", "purchases"),
+    ("profit", "income", "earnings", "surplus"),
+    ("receivable", "receivables", "debtors", "debtor"),
+    ("payable", "payables", "creditors", "creditor"),
+    ("equity", "capital", "worth", "reserves"),
+    ("ppe", "property", "plant", "equipment", "fixed", "tangible"),
+    ("depreciation", "amortisation", "amortization"),
+    ("inventory", "inventories", "stock", "stocks"),
+    ("cash", "bank", "equivalents"),
+    ("expense", "expenses", "expenditure", "charges", "overheads"),
+    ("borrowings", "loan", "loans", "debt"),
+    ("tax", "taxation", "vat"),
+)
+
+# Weight of word overlap vs trigram similarity in the shortlist score
+TOKEN_WEIGHT = 0.6
+
+
+def _expansions() -> Dict[str, Set[str]]:
+    expansions: Dict[str, Set[str]] = {}
+    for group in EQUIVALENT_WORDS:
+        for word in group:
+            expansions.setdefault(word, set()).update(group)
+    return expansions
+
+
+_EXPANSIONS = _expansions()
+
+
+def _trigrams(tokens: Iterable[str]) -> Set[str]:
+    grams = set()
+    for token in tokens:
+        padded = f" {token} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class AccountIndex:
+    """Inverted token and trigram index for shortlisting accounts per label."""
+
+    def __init__(self, accounts: Iterable[str]):
+        self.accounts: List[str] = list(accounts)
+        self._grams: List[Set[str]] = []
+        self._by_token: Dict[str, List[int]] = {}
+        self._by_gram: Dict[str, List[int]] = {}
+
+        for position, account in enumerate(self.accounts):
+            tokens = set(normalize_name(account).split())
+            grams = _trigrams(tokens)
+            self._grams.append(grams)
+            for token in tokens:
+                self._by_token.setdefault(token, []).append(position)
+            for gram in grams:
+                self._by_gram.setdefault(gram, []).append(position)
+
+        # Rare words say more about a match than "total" or "other"
+        count = max(len(self.accounts), 1)
+        self._idf = {
+            token: math.log(1 + count / len(positions))
+            for token, positions in self._by_token.items()
+        }
+        self._default_idf = math.log(1 + count)
+        # Label -> scores; filled from worker threads, where a race only
+        # means scoring a label twice
+        self._scores: Dict[str, Dict[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def scores(self, label: str) -> Dict[int, float]:
+        """Scores in [0, 1] for accounts sharing a word or trigram with label.
+
+        Results are cached per label and shared; callers must not modify them.
+        """
+        cached = self._scores.get(label)
+        if cached is None:
+            cached = self._scores[label] = self._score(label)
+        return cached
+
+    def _score(self, label: str) -> Dict[int, float]:
+        tokens = set(normalize_name(label).split())
+        if not tokens:
+            return {}
+
+        token_scores: Counter = Counter()
+        total_weight = 0.0
+        for token in tokens:
+            weight = self._idf.get(token, self._default_idf)
+            total_weight += weight
+            matched = set()
+            for word in _EXPANSIONS.get(token, (token,)):
+                matched.update(self._by_token.get(word, ()))
+            for position in matched:
+                token_scores[position] += weight
+
+        grams = _trigrams(tokens)
+        shared: Counter = Counter()
+        for gram in grams:
+            for position in self._by_gram.get(gram, ()):
+                shared[position] += 1
+
+        scores = {}
+        for position in token_scores.keys() | shared.keys():
+            token_part = token_scores[position] / total_weight
+            gram_part = 2 * shared[position] / (len(grams) + len(self._grams[position]))
+            scores[position] = TOKEN_WEIGHT * token_part + (1 - TOKEN_WEIGHT) * gram_part
+        return scores
+
+    def shortlist(self, labels: Sequence[str], k: int) -> List[str]:
+        """Union of every label's top-k accounts, in original account order.
+
+        Small account lists, and batches where no label matches anything,
+        get every account.
+        """
+        if len(self.accounts) <= k:
+            return list(self.accounts)
+
+        keep: Set[int] = set()
+        for label in labels:
+            ranked = sorted(
+                self.scores(label).items(), key=lambda item: (-item[1], item[0])
+            )
+            keep.update(position for position, _ in ranked[:k])
+
+        if not keep:
+            return list(self.accounts)
+        return [self.accounts[position] for position in sorted(keep)]
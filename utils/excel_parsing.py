@@ -0,0 +1,139 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+ACCOUNT_CODE_PREFIX = r"^\d+\s*-\s*"
+
+# Cell types pd.to_numeric converts exactly as float() does. Strings are
+# not among them: its text parser can be 1 ulp off, so they go through
+# float() itself, as do datetimes, timedeltas and other odd cells
+NUMERIC_CELL_TYPES = {int, float, bool, np.int64, np.float64, np.bool_}
+
+# Numeric cells an amount column keeps as they are; booleans are read as
+# text there ("True"), which is not an amount
+AMOUNT_CELL_TYPES = NUMERIC_CELL_TYPES - {bool, np.bool_}
+
+
+def _python_float(value) -> Optional[float]:
+    """float(value), or None when Python cannot convert it."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_floats(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Convert a column to floats with float() semantics, vectorized.
+
+    Returns (numbers, parsed) where parsed marks values float() accepts.
+    pd.to_numeric handles numeric cells; everything else (text, "nan",
+    "1_000", ...) is converted with float() so results match a per-row loop
+    bit for bit.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_timedelta64_dtype(values):
+        # float() rejects Timestamps/Timedeltas outright
+        return pd.Series(np.nan, index=values.index), pd.Series(False, index=values.index)
+
+    values_for_numeric = values
+    if not pd.api.types.is_numeric_dtype(values):
+        # Object or string columns: only numeric cells go to pd.to_numeric
+        values = values.astype(object)
+        values_for_numeric = values.where(values.map(type).isin(NUMERIC_CELL_TYPES))
+
+    numbers = pd.to_numeric(values_for_numeric, errors="coerce").astype(float)
+    parsed = numbers.notna()
+
+    retry = ~parsed & values.notna()
+    if retry.any():
+        # float("nan") succeeds, so success is tracked apart from the value
+        fallback = [_python_float(value) for value in values[retry]]
+        numbers[retry] = [np.nan if f is None else f for f in fallback]
+        parsed[retry] = [f is not None for f in fallback]
+
+    return numbers, parsed
+
+
+def parse_amounts(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Parse amount cells, stripping separators and reading (123) as -123.
+
+    Numeric cells are taken as they are; only the other cells are turned
+    into text and cleaned. Returns (numbers, parsed) like to_floats().
+    """
+    if pd.api.types.is_bool_dtype(values):
+        # Read as text, "True"/"False" never parse
+        return pd.Series(np.nan, index=values.index), pd.Series(False, index=values.index)
+    if pd.api.types.is_numeric_dtype(values):
+        return to_floats(values)
+
+    is_text = values.notna() & ~values.map(type).isin(AMOUNT_CELL_TYPES)
+    text = (
+        values[is_text]
+        .astype(str)
+        .str.replace(",", "", regex=False)
+        .str.replace(" ", "", regex=False)
+        .str.strip()
+    )
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.mask(negative, "-" + text.str[1:-1])
+
+    cells = values.astype(object)
+    cells[is_text] = text
+    return to_floats(cells)
+
+
+def clean_account_names(names: pd.Series) -> pd.Series:
+    """Strip account-code prefixes ("40050 - ") and the IC_ marker."""
+    return (
+        names.str.replace(ACCOUNT_CODE_PREFIX, "", regex=True)
+        .str.replace("IC_", "", regex=False)
+        .str.strip()
+    )
+
+
+def extract_accounts(
+    names: pd.Series,
+    values: pd.Series,
+    skip_labels: Iterable[str],
+    parse_text_amounts: bool = False,
+    clean_names: bool = False,
+) -> Dict[str, float]:
+    """Build {account: value} from a name column and a value column.
+
+    Rows with a missing name or value, a header-like name (lower-cased,
+    in skip_labels), an unparseable value or a zero value are dropped.
+    Later rows win on duplicate names, as with a row-by-row dict build.
+    """
+    names = names.reset_index(drop=True)
+    values = values.reset_index(drop=True)
+    keep = names.notna() & values.notna()
+
+    name_text = names[keep].astype(str)
+    stripped = name_text.str.strip()
+    keep_names = ~name_text.str.lower().isin(set(skip_labels))
+    if clean_names:
+        # Blank names are skipped, and the skip check uses the stripped name
+        keep_names = (stripped != "") & ~stripped.str.lower().isin(set(skip_labels))
+    name_text = name_text[keep_names]
+    stripped = stripped[keep_names]
+
+    row_values = values[name_text.index]
+    if parse_text_amounts:
+        numbers, parsed = parse_amounts(row_values)
+    else:
+        numbers, parsed = to_floats(row_values)
+    keep_rows = parsed & (numbers != 0)
+
+    accounts = stripped[keep_rows]
+    if clean_names:
+        accounts = clean_account_names(accounts)
+
+    return dict(zip(accounts.tolist(), numbers[keep_rows].tolist()))
+
+
+def column_position(columns: pd.Index, column) -> int:
+    """Position of the first column with the given label."""
+    for position, label in enumerate(columns):
+        if label is column or label == column:
+            return position
+    raise KeyError(column)
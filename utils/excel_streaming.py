@@ -0,0 +1,158 @@
+"""
+Streaming, read-only workbook access for very large trial balances.
+
+pd.read_excel(sheet_name=None) materializes every sheet before any of it is
+inspected. iter_sheets() instead walks an openpyxl read_only workbook one
+sheet at a time: callers sniff the header and year columns from the first
+rows with peek(), then pull account rows lazily in fixed-size chunks.
+
+Cells are converted with the same rules pandas' openpyxl reader uses, so a
+streamed sheet yields the values read_excel would have put in its frame.
+The one difference: read_excel re-types a whole column once it has seen it
+(numeric text or booleans in a numeric column become floats); a stream
+cannot look ahead, so such cells keep the type they were stored with.
+"""
+
+import io
+from collections import defaultdict
+from itertools import islice
+from typing import Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+# Strings read_excel turns into NaN by default
+NA_STRINGS = {
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+}
+
+# Rows per chunk handed to the vectorized parsers
+CHUNK_ROWS = 10000
+
+
+def _is_empty(cell) -> bool:
+    return cell.value is None or cell.value == ""
+
+
+def convert_cell(cell):
+    """Cell value as read_excel would load it."""
+    value = cell.value
+    if value is None or cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        whole = int(value)
+        return whole if whole == value else float(value)
+    if isinstance(value, str) and value in NA_STRINGS:
+        return np.nan
+    return value
+
+
+def header_labels(cells: Sequence) -> List:
+    """Column labels for a header row: blanks become "Unnamed: i", repeats get ".n"."""
+    labels = []
+    counts = defaultdict(int)
+    for position, cell in enumerate(cells):
+        label = f"Unnamed: {position}" if _is_empty(cell) else convert_cell(cell)
+        count = counts[label]
+        while count > 0:
+            counts[label] = count + 1
+            label = f"{label}.{count}"
+            count = counts[label]
+        counts[label] = count + 1
+        labels.append(label)
+    return labels
+
+
+def _sheet_rows(worksheet) -> Iterator[tuple]:
+    """Raw rows, with trailing blank rows dropped like read_excel does."""
+    pending_blank = []
+    for row in worksheet.rows:
+        if all(_is_empty(cell) for cell in row):
+            pending_blank.append(())
+            continue
+        yield from pending_blank
+        pending_blank.clear()
+        yield row
+
+
+class SheetStream:
+    """Lazily read rows of one worksheet, below its first (header) row."""
+
+    def __init__(self, worksheet):
+        self.name = worksheet.title
+        self._rows = _sheet_rows(worksheet)
+        first_row = next(self._rows, ())
+        self.columns = header_labels(first_row)
+        self._first_row = [convert_cell(cell) for cell in first_row]
+        self._buffer: List[list] = []
+
+    def head(self, count: int) -> List[list]:
+        """First `count` rows including the header row, as read_excel(header=None) sees them."""
+        return [self._first_row] + self.peek(count - 1)
+
+    def peek(self, count: int) -> List[list]:
+        """First `count` data rows (fewer if the sheet is shorter), without consuming them."""
+        while len(self._buffer) < count:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer.append([convert_cell(cell) for cell in row])
+        return self._buffer[:count]
+
+    def rows(self) -> Iterator[list]:
+        """All remaining data rows, starting with any peeked ones."""
+        buffered, self._buffer = self._buffer, []
+        yield from buffered
+        for row in self._rows:
+            yield [convert_cell(cell) for cell in row]
+
+    def column_chunks(
+        self, positions: Sequence[int], start: int = 0, chunk_rows: int = CHUNK_ROWS
+    ) -> Iterator[List[pd.Series]]:
+        """Yield the requested columns, `chunk_rows` rows at a time, skipping `start` rows."""
+        rows = islice(self.rows(), start, None)
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                return
+            yield [
+                pd.Series(
+                    [row[position] if position < len(row) else np.nan for row in chunk],
+                    dtype=object,
+                )
+                for position in positions
+            ]
+
+
+def iter_sheets(file_bytes: bytes) -> Iterator[SheetStream]:
+    """Yield a SheetStream per worksheet of a read-only workbook."""
+    workbook = load_workbook(
+        io.BytesIO(file_bytes), read_only=True, data_only=True, keep_links=False
+    )
+    try:
+        for worksheet in workbook.worksheets:
+            # Stored dimensions can be stale; read every row that is present
+            worksheet.reset_dimensions()
+            yield SheetStream(worksheet)
+    finally:
+        workbook.close()
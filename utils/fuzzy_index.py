@@ -0,0 +1,133 @@
+"""
+Fuzzy string scores for many labels against one account list.
+
+The mappers score every label against every account with fuzzywuzzy,
+re-processing both strings for each pair. FuzzyIndex processes the
+accounts once and returns whole label x account score matrices. With
+rapidfuzz installed the matrices come from process.cdist (C++, all cores);
+otherwise it falls back to fuzzywuzzy on the pre-processed strings.
+
+Scores are 0-100 integers on fuzzywuzzy's scale, so existing thresholds
+(90/70, 85/65) keep their meaning, but they only equal fuzzywuzzy's own
+scores in the fallback path. rapidfuzz computes token_set_ratio and
+partial_ratio slightly differently: some pairs score higher than under
+fuzzywuzzy, and the best match for a label can break ties differently.
+"""
+
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz as _rapid_fuzz
+    from rapidfuzz import process as _rapid_process
+except ImportError:  # pragma: no cover - optional dependency
+    _rapid_fuzz = None
+    _rapid_process = None
+
+_NON_WORD = re.compile(r"(?ui)\W")
+
+# Labels scored per cdist call; bounds the float matrix held at once
+_QUERY_CHUNK = 256
+
+
+def full_process(text: str) -> str:
+    """fuzzywuzzy's default processing: ASCII only, punctuation to spaces,
+    lower-cased and stripped."""
+    text = "".join(char for char in text if ord(char) < 128)
+    return _NON_WORD.sub(" ", text).lower().strip()
+
+
+class FuzzyIndex:
+    """Account names processed once for vectorized fuzzy scoring."""
+
+    def __init__(self, choices: Iterable[str], workers: int = -1):
+        self.choices: List[str] = list(choices)
+        # Threads per rapidfuzz cdist call (-1: all cores)
+        self.workers = workers
+        # token_set_ratio works on processed text, partial_ratio on lower case
+        self._processed = [full_process(choice) for choice in self.choices]
+        self._lowered = [choice.lower() for choice in self.choices]
+
+    def __len__(self) -> int:
+        return len(self.choices)
+
+    def token_set_ratio(self, queries: Sequence[str]) -> np.ndarray:
+        """fuzz.token_set_ratio of every query against every choice."""
+        return self._matrix(
+            [full_process(query) for query in queries], self._processed, "token_set"
+        )
+
+    def partial_ratio(self, queries: Sequence[str]) -> np.ndarray:
+        """fuzz.partial_ratio of every lower-cased query against every choice."""
+        return self._matrix(
+            [query.lower() for query in queries], self._lowered, "partial"
+        )
+
+    def best(self, queries: Sequence[str]) -> List[Tuple[Optional[str], int]]:
+        """Best choice by token_set_ratio per query; first choice wins ties.
+
+        A query that scores 0 against everything gets (None, 0).
+        """
+        if not self.choices:
+            return [(None, 0) for _ in queries]
+
+        scores = self.token_set_ratio(queries)
+        best = scores.argmax(axis=1)
+        return [
+            (self.choices[position], int(row[position]))
+            if row[position] > 0
+            else (None, 0)
+            for row, position in zip(scores, best)
+        ]
+
+    def top_k(self, query: str, k: int) -> List[Tuple[str, int]]:
+        """The k best choices by token_set_ratio, in choice order on ties."""
+        if not self.choices:
+            return []
+
+        scores = self.token_set_ratio([query])[0]
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(self.choices[position], int(scores[position])) for position in order]
+
+    def _matrix(
+        self, queries: List[str], choices: List[str], scorer: str
+    ) -> np.ndarray:
+        scores = np.zeros((len(queries), len(choices)), dtype=np.int32)
+        if not queries or not choices:
+            return scores
+
+        if _rapid_process is not None:
+            rapid_scorer = (
+                _rapid_fuzz.token_set_ratio
+                if scorer == "token_set"
+                else _rapid_fuzz.partial_ratio
+            )
+            for start in range(0, len(queries), _QUERY_CHUNK):
+                chunk = _rapid_process.cdist(
+                    queries[start : start + _QUERY_CHUNK],
+                    choices,
+                    scorer=rapid_scorer,
+                    processor=None,
+                    workers=self.workers,
+                )
+                # Whole numbers, rounded like fuzzywuzzy's int(round(x))
+                scores[start : start + len(chunk)] = np.rint(chunk)
+            return scores
+
+        from fuzzywuzzy import fuzz
+
+        for row, query in enumerate(queries):
+            if scorer == "token_set":
+                if not query:
+                    continue
+                scores[row] = [
+                    fuzz.token_set_ratio(query, choice, full_process=False)
+                    if choice
+                    else 0
+                    for choice in choices
+                ]
+            else:
+                scores[row] = [fuzz.partial_ratio(query, choice) for choice in choices]
+        return scores
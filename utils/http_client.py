@@ -0,0 +1,382 @@
+"""
+Shared pooled HTTP client for OpenRouter chat completions.
+
+Every LLM caller goes through one requests.Session, so connections are
+kept alive between calls instead of paying a new TCP/TLS handshake each
+time. The client also owns the retry policy (jittered exponential backoff
+on 429/5xx, honouring Retry-After), a per-model circuit breaker that
+fails fast once a model keeps erroring, and per-model latency and token
+counters. stream_chat_completion() yields the reply as server-sent tokens
+arrive, for callers that can use partial output.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import (
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+    CIRCUIT_BREAKER_THRESHOLD,
+    HTTP_BACKOFF_BASE_SECONDS,
+    HTTP_BACKOFF_MAX_SECONDS,
+    HTTP_MAX_RETRIES,
+    HTTP_POOL_SIZE,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+)
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Statuses worth retrying on the same model after a pause
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenRouterError(Exception):
+    """A chat completion that failed after retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(OpenRouterError):
+    """The model's circuit is open; the call was not attempted."""
+
+
+class _ModelStats:
+    __slots__ = (
+        "calls",
+        "failures",
+        "retries",
+        "latency_total",
+        "prompt_tokens",
+        "completion_tokens",
+        "consecutive_failures",
+        "opened_at",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+
+
+class OpenRouterClient:
+    """Keep-alive chat completion client with retries and circuit breaking."""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        pool_size: int = 16,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        breaker_threshold: int = 3,
+        breaker_cooldown: float = 60.0,
+    ):
+        self.api_key = api_key if api_key is not None else OPENROUTER_API_KEY
+        self.base_url = (base_url or OPENROUTER_BASE_URL).rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            }
+        )
+
+        self._stats: Dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def chat_completion(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **params,
+    ) -> str:
+        """Return the reply text of one chat completion.
+
+        Raises CircuitOpenError when the model is cooling down,
+        OpenRouterError for failed responses and requests exceptions for
+        timeouts. Extra keyword arguments go into the request payload.
+        """
+        self._check_circuit(model)
+
+        payload = {"model": model, "messages": messages, "temperature": temperature}
+        payload.update(params)
+
+        response, latency = self._post(model, payload, timeout, headers)
+        try:
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self._record_failure(model, latency)
+            raise OpenRouterError(f"Malformed API response: {e}", 200)
+
+        self._record_success(model, latency, result.get("usage") or {})
+        return content
+
+    def stream_chat_completion(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **params,
+    ) -> Iterator[str]:
+        """Yield the reply text of a streamed chat completion as it arrives.
+
+        Retries and the circuit breaker apply until the response starts;
+        a stream that breaks off midway raises OpenRouterError.
+        """
+        self._check_circuit(model)
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+        }
+        payload.update(params)
+
+        started = time.perf_counter()
+        response, _ = self._post(model, payload, timeout, headers, stream=True)
+        usage: Dict = {}
+        try:
+            # Server-sent events: "data: {chunk}" lines, ": comment" keep-alives
+            for line in response.iter_lines(chunk_size=None):
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise OpenRouterError(f"Stream error: {chunk['error']}")
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or ():
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+
+        except (requests.RequestException, ValueError, OpenRouterError) as e:
+            self._record_failure(model, time.perf_counter() - started)
+            if isinstance(e, OpenRouterError):
+                raise
+            raise OpenRouterError(f"Stream interrupted: {e}")
+        finally:
+            response.close()
+
+        self._record_success(model, time.perf_counter() - started, usage)
+
+    def _post(
+        self,
+        model: str,
+        payload: Dict,
+        timeout: Optional[float],
+        headers: Optional[Dict[str, str]],
+        stream: bool = False,
+    ) -> Tuple[requests.Response, float]:
+        """POST a completion request, retrying retryable failures.
+
+        Returns a 200 response and its latency; anything else is recorded
+        against the model and raised.
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    timeout=timeout,
+                    stream=stream,
+                )
+            except requests.ConnectionError as e:
+                if attempt < self.max_retries:
+                    self._wait_before_retry(model, attempt, None, f"connection error: {e}")
+                    attempt += 1
+                    continue
+                self._record_failure(model, time.perf_counter() - started)
+                raise
+            except requests.Timeout:
+                self._record_failure(model, time.perf_counter() - started)
+                raise
+
+            latency = time.perf_counter() - started
+
+            if response.status_code in RETRYABLE_STATUSES and attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                self._wait_before_retry(
+                    model, attempt, retry_after, f"status {response.status_code}"
+                )
+                attempt += 1
+                continue
+
+            if response.status_code != 200:
+                self._record_failure(model, latency)
+                raise OpenRouterError(
+                    f"API error {response.status_code}: {response.text}",
+                    response.status_code,
+                )
+
+            return response, latency
+
+    async def achat_completion(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **params,
+    ) -> str:
+        """Async chat_completion; runs on a worker thread so the pool,
+        breaker and metrics are shared with synchronous callers."""
+        return await asyncio.to_thread(
+            self.chat_completion,
+            model,
+            messages,
+            temperature,
+            timeout,
+            headers,
+            **params,
+        )
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        # Full jitter keeps concurrent batches from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def _wait_before_retry(
+        self, model: str, attempt: int, retry_after: Optional[str], reason: str
+    ):
+        delay = self._backoff_delay(attempt, retry_after)
+        with self._lock:
+            self._stats_for(model).retries += 1
+        logger.warning(
+            f"{model}: {reason}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+        )
+        time.sleep(delay)
+
+    def _stats_for(self, model: str) -> _ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = _ModelStats()
+        return stats
+
+    def _check_circuit(self, model: str):
+        with self._lock:
+            stats = self._stats_for(model)
+            if stats.opened_at is None:
+                return
+            remaining = self.breaker_cooldown - (time.monotonic() - stats.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(
+                    f"Circuit open for {model} ({remaining:.0f}s left)"
+                )
+            # Cooldown over: let calls through, one more failure re-opens it
+            stats.opened_at = None
+            stats.consecutive_failures = self.breaker_threshold - 1
+
+    def _record_success(self, model: str, latency: float, usage: Dict):
+        with self._lock:
+            stats = self._stats_for(model)
+            stats.calls += 1
+            stats.latency_total += latency
+            stats.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            stats.completion_tokens += int(usage.get("completion_tokens") or 0)
+            stats.consecutive_failures = 0
+        logger.debug(
+            f"{model}: {latency:.2f}s, {usage.get('prompt_tokens', '?')} prompt / "
+            f"{usage.get('completion_tokens', '?')} completion tokens"
+        )
+
+    def _record_failure(self, model: str, latency: float):
+        with self._lock:
+            stats = self._stats_for(model)
+            stats.calls += 1
+            stats.failures += 1
+            stats.latency_total += latency
+            stats.consecutive_failures += 1
+            if (
+                stats.opened_at is None
+                and stats.consecutive_failures >= self.breaker_threshold
+            ):
+                stats.opened_at = time.monotonic()
+                logger.warning(
+                    f"{model}: {stats.consecutive_failures} consecutive failures, "
+                    f"circuit open for {self.breaker_cooldown:.0f}s"
+                )
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Per-model call, retry, latency and token counters."""
+        with self._lock:
+            return {
+                model: {
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "retries": stats.retries,
+                    "avg_latency": stats.latency_total / stats.calls
+                    if stats.calls
+                    else 0.0,
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                    "circuit_open": stats.opened_at is not None,
+                }
+                for model, stats in self._stats.items()
+            }
+
+
+_default_client: Optional[OpenRouterClient] = None
+_default_client_lock = threading.Lock()
+
+
+def default_http_client() -> OpenRouterClient:
+    """Process-wide OpenRouter client shared by every LLM caller."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OpenRouterClient(
+                pool_size=HTTP_POOL_SIZE,
+                max_retries=HTTP_MAX_RETRIES,
+                backoff_base=HTTP_BACKOFF_BASE_SECONDS,
+                backoff_max=HTTP_BACKOFF_MAX_SECONDS,
+                breaker_threshold=CIRCUIT_BREAKER_THRESHOLD,
+                breaker_cooldown=CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+            )
+        return _default_client
@@ -0,0 +1,78 @@
+"""
+Incremental parsing of a streamed JSON object.
+
+LLM mapping replies are one JSON object keyed by template label. When the
+reply is streamed, JSONObjectStream is fed the text as it arrives and
+hands back each top-level member as soon as its value is complete, so
+results can be shown long before the closing brace arrives. Text before
+the first "{" (e.g. a markdown code fence) is ignored.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class JSONObjectStream:
+    """Yields completed (key, value) members of the first top-level object."""
+
+    def __init__(self):
+        self._member: List[str] = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume more text; return the members it completed, in order."""
+        members: List[Tuple[str, Any]] = []
+
+        for char in text:
+            if self.done:
+                break
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+                    self._complete(members)
+                    break
+            elif char == "," and self._depth == 1:
+                self._complete(members)
+                continue
+
+            self._member.append(char)
+
+        return members
+
+    def _complete(self, members: List[Tuple[str, Any]]):
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return
+
+        # A member that does not parse on its own is skipped, not fatal
+        try:
+            members.extend(json.loads("{" + text + "}").items())
+        except ValueError:
+            pass
@@ -0,0 +1,217 @@
+"""
+Persistent cache for LLM chat completions.
+
+Mapping prompts for a given template rarely change between runs, so the
+response text is kept in a small SQLite database keyed by model,
+temperature and a hash of the whitespace-normalized messages. Entries
+expire after a maximum age and the least recently used ones are evicted
+once the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config.settings import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_AGE_DAYS,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+)
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so cosmetic prompt changes share one entry."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def contains_json_object(text: str) -> bool:
+    """True if the text from its first "{" to its last "}" parses as JSON."""
+    start, end = text.find("{"), text.rfind("}") + 1
+    if start == -1 or end <= start:
+        return False
+    try:
+        json.loads(text[start:end])
+        return True
+    except ValueError:
+        return False
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache with age/size eviction and hit counters."""
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5000,
+        max_age_days: float = 30,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per call keeps this safe across threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key_for(model: str, temperature: float, messages: List[Dict]) -> str:
+        """Fingerprint of a request: model, temperature and normalized messages."""
+        fingerprint = json.dumps(
+            {
+                "model": model,
+                "temperature": round(float(temperature), 4),
+                "messages": [
+                    [message.get("role", ""), normalize_prompt(message.get("content", ""))]
+                    for message in messages
+                ],
+            },
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, temperature: float, messages: List[Dict]) -> Optional[str]:
+        """Cached response text, or None on a miss (expired entries are misses)."""
+        key = self.key_for(model, temperature, messages)
+        now = time.time()
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, now - self.max_age_seconds),
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+                    )
+
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if row:
+            logger.info(f"LLM cache hit ({model}, {key[:12]})")
+            return row[0]
+        return None
+
+    def put(
+        self,
+        model: str,
+        temperature: float,
+        messages: List[Dict],
+        content: str,
+        require_json: bool = True,
+    ):
+        """Store a response and apply age and size eviction.
+
+        With require_json, replies without a parseable JSON object are not
+        stored, so one garbled answer is retried next run instead of replayed.
+        """
+        if require_json and not contains_json_object(content):
+            return
+
+        key = self.key_for(model, temperature, messages)
+        now = time.time()
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, model, content, now, now),
+                )
+                conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (now - self.max_age_seconds,),
+                )
+                conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_used DESC
+                        LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the current entry count."""
+        try:
+            with self._connect() as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _default_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(
+                LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS
+            )
+        return _default_cache
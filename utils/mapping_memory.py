@@ -0,0 +1,230 @@
+"""
+Persistent label -> account memory built from accepted mappings.
+
+Most template labels map to the same account names client after client.
+Mappings a user edits, and High-confidence ones they save unchanged, are
+recorded against normalized label and account names; later runs look labels up here first and only
+send the ones without a trusted answer to the LLM.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import (
+    MAPPING_MEMORY_ENABLED,
+    MAPPING_MEMORY_MIN_CONFIDENCE,
+    MAPPING_MEMORY_PATH,
+)
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+_ACCOUNT_CODE_PREFIX = re.compile(r"^\d+\s*-\s*")
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+# SQLite caps bound parameters per statement
+_QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mappings (
+    label_key TEXT NOT NULL,
+    account_key TEXT NOT NULL,
+    label TEXT NOT NULL,
+    account TEXT NOT NULL,
+    accepted INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    confidence REAL NOT NULL DEFAULT 0,
+    uses INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (label_key, account_key)
+)
+"""
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, drop account-code prefixes ("40050 - ") and punctuation."""
+    name = _ACCOUNT_CODE_PREFIX.sub("", name.strip()).replace("IC_", "")
+    return _NON_ALPHANUMERIC.sub(" ", name.lower()).strip()
+
+
+class RememberedMapping:
+    """A label's remembered account, resolved against the current client's accounts."""
+
+    __slots__ = ("account", "confidence", "accepted", "uses")
+
+    def __init__(self, account: str, confidence: float, accepted: int, uses: int):
+        self.account = account
+        self.confidence = confidence
+        self.accepted = accepted
+        self.uses = uses
+
+
+class MappingMemory:
+    """SQLite-backed label -> account memory with usage and confidence tracking."""
+
+    def __init__(self, path: str, min_confidence: float = 0.9):
+        self.path = Path(path)
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                conn.execute(SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, label: str, account: str, confidence: float = 1.0):
+        """Record one accepted label -> account pair."""
+        self.record_many([(label, account, confidence)])
+
+    def record_many(self, pairs: Iterable[Tuple[str, str, float]]):
+        """Record accepted pairs; confidence is averaged over acceptances."""
+        now = time.time()
+        rows = [
+            (normalize_name(label), normalize_name(account), label, account, confidence, now)
+            for label, account, confidence in pairs
+            if label and account and normalize_name(label) and normalize_name(account)
+        ]
+        if not rows:
+            return
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO mappings
+                       (label_key, account_key, label, account, accepted, confidence, updated_at)
+                   VALUES (?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (label_key, account_key) DO UPDATE SET
+                       label = excluded.label,
+                       account = excluded.account,
+                       confidence = (confidence * accepted + excluded.confidence)
+                                    / (accepted + 1),
+                       accepted = accepted + 1,
+                       updated_at = excluded.updated_at""",
+                rows,
+            )
+
+    def reject(self, label: str, account: str):
+        """Count a remembered pair as wrong (e.g. the user changed it)."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """UPDATE mappings SET rejected = rejected + 1, updated_at = ?
+                   WHERE label_key = ? AND account_key = ?""",
+                (time.time(), normalize_name(label), normalize_name(account)),
+            )
+
+    def record_review(self, rows: Iterable[Tuple[str, str, str, float, bool]]):
+        """Learn from reviewed (label, account, previous account, confidence, high) rows.
+
+        confidence (0-1) and high describe the row as it was proposed. A row
+        whose account the user changed counts as accepted with confidence
+        1.0, and the replaced account as rejected. An unchanged row counts
+        as accepted, at its own confidence, only if it was already High;
+        saving other rows untouched does not make them trusted.
+        """
+        accepted = []
+        for label, account, previous, confidence, high in rows:
+            if not isinstance(label, str) or not label.strip():
+                continue
+            account = account if isinstance(account, str) else ""
+            previous = previous if isinstance(previous, str) else ""
+            edited = account != previous
+            if account and edited:
+                accepted.append((label, account, 1.0))
+            elif account and high:
+                accepted.append((label, account, min(max(confidence, 0.0), 1.0)))
+            if previous and edited:
+                self.reject(label, previous)
+        self.record_many(accepted)
+        logger.info(f"Mapping memory: recorded {len(accepted)} reviewed mappings")
+
+    def lookup(
+        self, labels: Iterable[str], accounts: Iterable[str]
+    ) -> Dict[str, RememberedMapping]:
+        """Trusted remembered accounts for labels, limited to accounts present now.
+
+        A pair is trusted when it was accepted more often than rejected and
+        its average confidence is at least min_confidence. The most often
+        accepted trusted pair wins. Served pairs have their use count bumped.
+        """
+        account_names: Dict[str, str] = {}
+        for account in accounts:
+            account_names.setdefault(normalize_name(account), account)
+
+        label_keys: Dict[str, List[str]] = {}
+        for label in labels:
+            key = normalize_name(label)
+            if key:
+                label_keys.setdefault(key, []).append(label)
+        if not label_keys or not account_names:
+            return {}
+
+        found: Dict[str, RememberedMapping] = {}
+        served = []
+        served_labels = set()
+        keys = list(label_keys)
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start : start + _QUERY_CHUNK]
+                rows = conn.execute(
+                    f"""SELECT label_key, account_key, accepted, confidence, uses
+                        FROM mappings
+                        WHERE label_key IN ({",".join("?" * len(chunk))})
+                          AND accepted > rejected AND confidence >= ?
+                        ORDER BY accepted - rejected DESC, confidence DESC,
+                                 updated_at DESC""",
+                    (*chunk, self.min_confidence),
+                ).fetchall()
+
+                for label_key, account_key, accepted, confidence, uses in rows:
+                    account = account_names.get(account_key)
+                    if account is None or label_key in served_labels:
+                        continue
+                    served_labels.add(label_key)
+                    served.append((label_key, account_key))
+                    for label in label_keys[label_key]:
+                        found[label] = RememberedMapping(
+                            account, confidence, accepted, uses + 1
+                        )
+
+            conn.executemany(
+                "UPDATE mappings SET uses = uses + 1 WHERE label_key = ? AND account_key = ?",
+                served,
+            )
+
+        return found
+
+    def stats(self) -> Dict:
+        """Size of the memory and how often it has been used."""
+        with self._connect() as conn:
+            pairs, labels, uses = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT label_key), COALESCE(SUM(uses), 0) FROM mappings"
+            ).fetchone()
+        return {"pairs": pairs, "labels": labels, "uses": uses}
+
+
+_default_memory: Optional[MappingMemory] = None
+_default_memory_lock = threading.Lock()
+
+
+def default_mapping_memory() -> Optional[MappingMemory]:
+    """Process-wide mapping memory, or None when MAPPING_MEMORY_ENABLED is off."""
+    global _default_memory
+    if not MAPPING_MEMORY_ENABLED:
+        return None
+
+    with _default_memory_lock:
+        if _default_memory is None:
+            _default_memory = MappingMemory(
+                MAPPING_MEMORY_PATH, MAPPING_MEMORY_MIN_CONFIDENCE
+            )
+        return _default_memory
@@ -0,0 +1,279 @@
+"""
+Batch sizing and model routing for IntelligentMapper's AI passes.
+
+Pass 1 used to cut labels into fixed batches of 20, send all of them to
+the first model and, after one failure, stay on the fallback model for
+the rest of the session. MappingScheduler instead:
+
+- splits labels into easy ones (a clear word/trigram match among the
+  accounts) for the fast primary model and hard ones for the larger model;
+- sizes each model's batches so the prompt stays within a token budget and
+  the reply is expected within a target time, using the reply speed
+  measured on that model's earlier batches;
+- demotes a failing model only for a recovery window, after which calls
+  start from it again;
+- keeps per-model throughput counters for logging.
+
+One scheduler is shared per model list, so measurements carry over from
+run to run within the process.
+"""
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config.settings import (
+    MAPPER_BATCH_TARGET_SECONDS,
+    MAPPER_EASY_SCORE,
+    MAPPER_MAX_BATCH_SIZE,
+    MAPPER_MODEL_RECOVERY_SECONDS,
+    MAPPER_PROMPT_TOKEN_BUDGET,
+)
+from utils.account_index import AccountIndex
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Instructions around the label and account lists in the pass-1 prompt
+PROMPT_OVERHEAD_TOKENS = 1400
+# Reply tokens per label (account, confidence, reasoning) until measured
+DEFAULT_REPLY_TOKENS_PER_LABEL = 80
+# Accounts listed per prompt at most (IntelligentMapper's cap)
+MAX_PROMPT_ACCOUNTS = 500
+# Weight of the newest batch in the running speed averages
+SMOOTHING = 0.3
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class MappingBatch:
+    """Labels sent in one prompt and the model tried first for them."""
+
+    labels: List[str]
+    model_index: int
+    hard: bool = False
+
+
+class _ModelThroughput:
+    __slots__ = (
+        "batches",
+        "labels",
+        "failures",
+        "seconds",
+        "reply_tokens",
+        "tokens_per_second",
+        "tokens_per_label",
+        "demoted_until",
+    )
+
+    def __init__(self):
+        self.batches = 0
+        self.labels = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.reply_tokens = 0
+        self.tokens_per_second: Optional[float] = None
+        self.tokens_per_label = float(DEFAULT_REPLY_TOKENS_PER_LABEL)
+        self.demoted_until: Optional[float] = None
+
+
+class MappingScheduler:
+    """Plans pass-1 batches per model and tracks which models are healthy."""
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        max_batch_size: int = 30,
+        prompt_token_budget: int = 12000,
+        reply_token_limit: int = 16000,
+        target_seconds: float = 90.0,
+        easy_score: float = 0.8,
+        hard_model_index: int = 1,
+        recovery_seconds: float = 120.0,
+    ):
+        self.models = list(models)
+        self.max_batch_size = max_batch_size
+        self.prompt_token_budget = prompt_token_budget
+        self.reply_token_limit = reply_token_limit
+        self.target_seconds = target_seconds
+        self.easy_score = easy_score
+        # With a single model everything goes to it
+        self.hard_model_index = hard_model_index if hard_model_index < len(self.models) else 0
+        self.recovery_seconds = recovery_seconds
+
+        self._stats = [_ModelThroughput() for _ in self.models]
+        self._lock = threading.Lock()
+
+    def plan(
+        self,
+        labels: Sequence[str],
+        account_index: AccountIndex,
+        shortlist_size: int,
+        batch_size: Optional[int] = None,
+    ) -> List[MappingBatch]:
+        """Split labels into easy and hard batches, each sized for its model.
+
+        A fixed batch_size overrides the token and latency sizing; labels
+        are still routed by difficulty.
+        """
+        easy, hard = [], []
+        for label in labels:
+            (easy if self.is_easy(label, account_index) else hard).append(label)
+
+        account_tokens = self._account_tokens(account_index)
+        batches = []
+        for tier, is_hard in ((easy, False), (hard, True)):
+            if not tier:
+                continue
+            model_index = self.hard_model_index if is_hard else 0
+            size = batch_size or self.batch_size_for(
+                model_index, tier, account_tokens, shortlist_size, len(account_index)
+            )
+            # Even batches rather than a full run and a small remainder
+            count = math.ceil(len(tier) / size)
+            size = math.ceil(len(tier) / count)
+            batches.extend(
+                MappingBatch(tier[i : i + size], model_index, is_hard)
+                for i in range(0, len(tier), size)
+            )
+        return batches
+
+    def is_easy(self, label: str, account_index: AccountIndex) -> bool:
+        """True if some account clearly matches the label lexically."""
+        if not len(account_index):
+            return True
+        return max(account_index.scores(label).values(), default=0.0) >= self.easy_score
+
+    def batch_size_for(
+        self,
+        model_index: int,
+        labels: Sequence[str],
+        account_tokens: float,
+        shortlist_size: int,
+        account_count: int,
+    ) -> int:
+        """Largest batch whose prompt, reply and expected time fit the budgets."""
+        with self._lock:
+            stats = self._stats[model_index]
+            tokens_per_label = stats.tokens_per_label
+            tokens_per_second = stats.tokens_per_second
+
+        label_tokens = sum(estimate_tokens(label) for label in labels) / len(labels)
+        size = 1
+        for candidate in range(2, self.max_batch_size + 1):
+            accounts = min(candidate * shortlist_size, account_count, MAX_PROMPT_ACCOUNTS)
+            prompt = (
+                PROMPT_OVERHEAD_TOKENS
+                + candidate * label_tokens
+                + accounts * account_tokens
+            )
+            reply = candidate * tokens_per_label
+            if prompt > self.prompt_token_budget or reply > self.reply_token_limit:
+                break
+            if tokens_per_second and reply / tokens_per_second > self.target_seconds:
+                break
+            size = candidate
+        return size
+
+    def start_model(self, preferred: int) -> int:
+        """First model to try: preferred unless it is demoted, then the next
+        healthy one. Demotions lapse after recovery_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            for offset in range(len(self.models)):
+                index = (preferred + offset) % len(self.models)
+                demoted_until = self._stats[index].demoted_until
+                if demoted_until is None or demoted_until <= now:
+                    return index
+        return preferred
+
+    def record_success(self, model_index: int, labels: int, seconds: float, reply: str):
+        """Count an answered batch and update the model's reply speed."""
+        tokens = estimate_tokens(reply)
+        with self._lock:
+            stats = self._stats[model_index]
+            recovered = stats.demoted_until is not None
+            stats.demoted_until = None
+            stats.batches += 1
+            stats.labels += labels
+            stats.seconds += seconds
+            stats.reply_tokens += tokens
+            if seconds > 0:
+                stats.tokens_per_second = _smooth(stats.tokens_per_second, tokens / seconds)
+            if labels:
+                stats.tokens_per_label = _smooth(stats.tokens_per_label, tokens / labels)
+        if recovered:
+            logger.info(f"{self.models[model_index]} answered again, back in rotation")
+
+    def record_failure(self, model_index: int):
+        """Demote a model so calls start elsewhere until it has had time to recover."""
+        with self._lock:
+            stats = self._stats[model_index]
+            stats.failures += 1
+            newly_demoted = stats.demoted_until is None
+            stats.demoted_until = time.monotonic() + self.recovery_seconds
+        if newly_demoted:
+            logger.warning(
+                f"{self.models[model_index]} failed, demoted for {self.recovery_seconds:.0f}s"
+            )
+
+    def throughput(self) -> Dict[str, Dict]:
+        """Per-model batches, labels, failures and speed so far."""
+        with self._lock:
+            return {
+                model: {
+                    "batches": stats.batches,
+                    "labels": stats.labels,
+                    "failures": stats.failures,
+                    "labels_per_second": stats.labels / stats.seconds
+                    if stats.seconds
+                    else 0.0,
+                    "tokens_per_second": stats.reply_tokens / stats.seconds
+                    if stats.seconds
+                    else 0.0,
+                    "demoted": stats.demoted_until is not None,
+                }
+                for model, stats in zip(self.models, self._stats)
+                if stats.batches or stats.failures
+            }
+
+    @staticmethod
+    def _account_tokens(account_index: AccountIndex) -> float:
+        # Prompt lines look like "- 40050 - Trade Sales ($1,234,567.89)"
+        if not len(account_index):
+            return 0.0
+        return sum(
+            estimate_tokens(f"- {account} ($0,000,000.00)")
+            for account in account_index.accounts
+        ) / len(account_index)
+
+
+def _smooth(average: Optional[float], value: float) -> float:
+    return value if average is None else (1 - SMOOTHING) * average + SMOOTHING * value
+
+
+_schedulers: Dict[Tuple[str, ...], MappingScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def default_mapping_scheduler(models: Sequence[str]) -> MappingScheduler:
+    """Process-wide scheduler for a model list, configured from settings."""
+    key = tuple(models)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = _schedulers[key] = MappingScheduler(
+                key,
+                max_batch_size=MAPPER_MAX_BATCH_SIZE,
+                prompt_token_budget=MAPPER_PROMPT_TOKEN_BUDGET,
+                target_seconds=MAPPER_BATCH_TARGET_SECONDS,
+                easy_score=MAPPER_EASY_SCORE,
+                recovery_seconds=MAPPER_MODEL_RECOVERY_SECONDS,
+            )
+        return scheduler
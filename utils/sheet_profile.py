@@ -0,0 +1,255 @@
+"""
+Header and year-column detection shared by the Excel extractors.
+
+detect_profile() looks at the first rows of a sheet once and records where
+the header row, the description column and the year columns are. Each
+extractor keeps its own HeaderRule (keywords, rows scanned, how strict a
+header row must be), so sharing the profile does not change what it
+extracts. Profiles are cached by workbook content hash, rule and sheet
+name, so re-uploading the same client file skips detection entirely.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+import pandas as pd
+
+from config.settings import CACHE_ENABLED, SHEET_PROFILE_CACHE_DIR
+from utils.logger import Logger
+
+logger = Logger(__name__)
+
+# Bump when detection rules change so cached profiles are not reused
+PROFILE_VERSION = "2"
+
+# Rows searched for a header
+HEADER_SCAN_ROWS = 10
+
+# 2025, 2025.0 (float headers) or 2025.1 (pandas-mangled duplicates)
+YEAR_PATTERN = re.compile(r"^(20\d{2})(?:\.\d*)?$")
+
+
+@dataclass(frozen=True)
+class HeaderRule:
+    """How one extractor recognizes a sheet's header row and columns."""
+
+    name: str  # Keeps each rule's cached profiles apart
+    header_keywords: Tuple[str, ...]
+    description_keywords: Tuple[str, ...]
+    # A header row needs this many filled cells
+    min_filled_cells: int = 1
+    # Rows above this are never the header (e.g. already used as labels)
+    first_row: int = 0
+    # A cell holding a year label (see year_pattern) also marks a header
+    match_year_cells: bool = False
+    year_pattern: Pattern = YEAR_PATTERN
+    # How a blank header cell reads when matching description keywords
+    blank_label: str = ""
+
+    @property
+    def head_rows(self) -> int:
+        """Rows (header=None layout) detection needs to see."""
+        return self.first_row + HEADER_SCAN_ROWS
+
+
+@dataclass(frozen=True)
+class SheetProfile:
+    """Where the data sits in one sheet; positions are 0-based."""
+
+    sheet_name: str
+    header_row: int
+    description_column: int
+    year_columns: Tuple[int, ...]  # Most recent year first
+    years: Tuple[int, ...]
+
+    @property
+    def value_column(self) -> Optional[int]:
+        """Column of the most recent year, or None without year columns."""
+        return self.year_columns[0] if self.year_columns else None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SheetProfile":
+        return cls(
+            sheet_name=data["sheet_name"],
+            header_row=data["header_row"],
+            description_column=data["description_column"],
+            year_columns=tuple(data["year_columns"]),
+            years=tuple(data["years"]),
+        )
+
+
+def _cell_text(value) -> str:
+    return "" if pd.isna(value) else str(value).strip()
+
+
+def _find_header_row(rows: Sequence[Sequence], rule: HeaderRule) -> Optional[int]:
+    """First scanned row with enough filled cells and a header keyword."""
+    for idx in range(rule.first_row, min(rule.head_rows, len(rows))):
+        cells = [_cell_text(value) for value in rows[idx]]
+        filled = [text for text in cells if text]
+        if len(filled) < rule.min_filled_cells:
+            continue
+
+        row_text = " ".join(text.lower() for text in filled)
+        if any(keyword in row_text for keyword in rule.header_keywords):
+            return idx
+        if rule.match_year_cells and any(
+            rule.year_pattern.match(text) for text in filled
+        ):
+            return idx
+
+    return None
+
+
+def _find_description_column(headers: List[str], rule: HeaderRule) -> int:
+    for position, header in enumerate(headers):
+        label = (header or rule.blank_label).lower()
+        if any(keyword in label for keyword in rule.description_keywords):
+            return position
+
+    # Default to first column if no match
+    return 0
+
+
+def detect_profile(
+    sheet_name: str, rows: Sequence[Sequence], rule: HeaderRule
+) -> Optional[SheetProfile]:
+    """Profile a sheet from its first rows (header=None layout); None if no header."""
+    header_row = _find_header_row(rows, rule)
+    if header_row is None:
+        return None
+
+    headers = [_cell_text(value) for value in rows[header_row]]
+
+    year_positions = []
+    for position, header in enumerate(headers):
+        match = rule.year_pattern.match(header)
+        if match:
+            year_positions.append((int(match.group(1)), position))
+    # Stable: for a repeated year the left-most column comes first
+    year_positions.sort(key=lambda item: -item[0])
+
+    return SheetProfile(
+        sheet_name=sheet_name,
+        header_row=header_row,
+        description_column=_find_description_column(headers, rule),
+        year_columns=tuple(position for _, position in year_positions),
+        years=tuple(year for year, _ in year_positions),
+    )
+
+
+class SheetProfileCache:
+    """Sheet profiles keyed by workbook hash, in memory and optionally on disk."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_workbooks: int = 128):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_workbooks = max_workbooks
+        self._workbooks: "OrderedDict[str, Dict[str, Optional[SheetProfile]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, file_bytes: bytes) -> str:
+        """Return the cache key for a workbook."""
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        return f"{digest}-v{PROFILE_VERSION}"
+
+    def get_or_detect(
+        self,
+        key: str,
+        rule: HeaderRule,
+        sheet_name: str,
+        head: Callable[[], Sequence[Sequence]],
+    ) -> Optional[SheetProfile]:
+        """Cached profile for a sheet; head() supplies its first rule.head_rows rows on a miss."""
+        # Each rule profiles the same workbook separately
+        key = f"{key}-{rule.name}"
+        with self._lock:
+            sheets = self._sheets_for(key)
+            if sheet_name in sheets:
+                return sheets[sheet_name]
+
+        profile = detect_profile(sheet_name, head(), rule)
+
+        with self._lock:
+            sheets = self._sheets_for(key)
+            sheets[sheet_name] = profile
+            self._write(key, sheets)
+        return profile
+
+    def _sheets_for(self, key: str) -> Dict[str, Optional[SheetProfile]]:
+        sheets = self._workbooks.get(key)
+        if sheets is None:
+            sheets = self._read(key)
+            self._workbooks[key] = sheets
+            if len(self._workbooks) > self.max_workbooks:
+                self._workbooks.popitem(last=False)
+        else:
+            self._workbooks.move_to_end(key)
+        return sheets
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _read(self, key: str) -> Dict[str, Optional[SheetProfile]]:
+        if not self.cache_dir or not self._path_for(key).exists():
+            return {}
+
+        try:
+            data = json.loads(self._path_for(key).read_text())
+            logger.info(f"Sheet profile cache hit: {key}")
+            return {
+                name: SheetProfile.from_dict(profile) if profile else None
+                for name, profile in data.items()
+            }
+
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable sheet profile entry {key}: {e}")
+            return {}
+
+    def _write(self, key: str, sheets: Dict[str, Optional[SheetProfile]]):
+        if not self.cache_dir:
+            return
+
+        data = {
+            name: profile.to_dict() if profile else None
+            for name, profile in sheets.items()
+        }
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(data, tmp_file)
+            os.replace(tmp_name, self._path_for(key))
+
+        except Exception as e:
+            logger.warning(f"Failed to write sheet profile entry {key}: {e}")
+            Path(tmp_name).unlink(missing_ok=True)
+
+
+_default_cache: Optional[SheetProfileCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_profile_cache() -> SheetProfileCache:
+    """Process-wide profile cache shared by every extractor."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SheetProfileCache(
+                SHEET_PROFILE_CACHE_DIR if CACHE_ENABLED else None
+            )
+        return _default_cache